@@ -0,0 +1,143 @@
+"""
+asyncio client for a ``-stay_open`` exiftool process
+
+:py:class:`AsyncExifTool` talks to exiftool over asyncio subprocess
+pipes, so waiting for exiftool doesn't block the event loop.  Any
+number of tasks may share one instance; their commands are sent to the
+process one at a time.  Every command is terminated with a numbered
+``-executeNUM``, so if a call times out or is cancelled, its output is
+recognized by ``{readyNUM}`` and discarded before the next command::
+
+    async with AsyncExifTool() as et:
+        metadata = await et.get_metadata_batch(files, timeout=10)
+"""
+
+import asyncio
+import itertools
+import json
+import warnings
+
+import exiftool
+from exiftool import fsencode, basestring
+
+# Read size for the stdout stream
+block_size = 1 << 16
+
+
+class AsyncExifTool():
+    """Run the `exiftool` command-line tool from asyncio code.
+
+    The interface mirrors :py:class:`exiftool.ExifTool`, but
+    :py:meth:`start()`, :py:meth:`terminate()` and all commands are
+    coroutines.  Commands accept an optional ``timeout`` in seconds;
+    ``asyncio.TimeoutError`` is raised when it expires.
+    """
+
+    def __init__(self, executable_=None):
+        self.executable = executable_ or exiftool.executable
+        self.running = False
+        self._process = None
+        self._lock = None
+        self._ids = itertools.count(1)
+        self._stale = None  # number of the command whose output is unread
+        self._buf = bytearray()
+
+    async def start(self):
+        """Start an ``exiftool`` process in batch mode.
+
+        The process is started with the same common arguments as
+        :py:meth:`exiftool.ExifTool.start()`.
+        """
+        if self.running:
+            warnings.warn("AsyncExifTool already running; doing nothing.")
+            return
+        self._process = await asyncio.create_subprocess_exec(
+            self.executable, "-stay_open", "True", "-@", "-",
+            "-common_args", "-G", "-n",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL)
+        self._lock = asyncio.Lock()
+        self.running = True
+
+    async def terminate(self):
+        """Terminate the ``exiftool`` process.
+
+        Waits for the command being executed, if any.
+        """
+        if not self.running:
+            return
+        async with self._lock:
+            self._process.stdin.write(b"-stay_open\nFalse\n")
+            await self._process.stdin.drain()
+            await self._process.communicate()
+            self._process = None
+            self.running = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.terminate()
+
+    async def _read_until(self, num):
+        "Read output of command `num`. Partial output survives cancellation"
+        marker = b"{ready%d}" % num
+        while not self._buf[-len(marker)-8:].rstrip().endswith(marker):
+            chunk = await self._process.stdout.read(block_size)
+            if not chunk:
+                raise IOError("exiftool process closed its output.")
+            self._buf += chunk
+        output = self._buf.strip()[:-len(marker)]
+        del self._buf[:]
+        return bytes(output)
+
+    async def _execute(self, params):
+        async with self._lock:
+            if self._stale is not None:  # skip output of a cancelled call
+                await self._read_until(self._stale)
+                self._stale = None
+            num = next(self._ids)
+            self._process.stdin.write(b"\n".join(
+                params + (b"-charset\nfilename=utf8\n-execute%d\n" % num,)))
+            self._stale = num
+            await self._process.stdin.drain()
+            output = await self._read_until(num)
+            self._stale = None
+            return output
+
+    async def execute(self, *params, timeout=None):
+        """Execute the given batch of parameters with ``exiftool``.
+
+        See :py:meth:`exiftool.ExifTool.execute()`.  The timeout
+        includes the time spent waiting for other commands.
+        """
+        if not self.running:
+            raise ValueError("AsyncExifTool instance not running.")
+        return await asyncio.wait_for(self._execute(params), timeout)
+
+    async def execute_json(self, *params, timeout=None):
+        """Execute the given batch of parameters and parse the JSON output.
+
+        See :py:meth:`exiftool.ExifTool.execute_json()`.
+        """
+        params = tuple(map(fsencode, params))
+        output = await self.execute(b"-j", *params, timeout=timeout)
+        return json.loads(output.decode("utf-8"))
+
+    async def get_metadata_batch(self, filenames, timeout=None):
+        """Return all meta-data for the given files.
+
+        See :py:meth:`exiftool.ExifTool.get_metadata_batch()`.
+        """
+        if isinstance(filenames, basestring):
+            raise TypeError("The argument 'filenames' must be "
+                            "an iterable of strings")
+        return await self.execute_json(*filenames, timeout=timeout)
+
+    async def get_metadata(self, filename, timeout=None):
+        """Return meta-data for a single file.
+
+        See :py:meth:`exiftool.ExifTool.get_metadata()`.
+        """
+        return (await self.execute_json(filename, timeout=timeout))[0]
@@ -0,0 +1,67 @@
+"""
+Decoding ``-j`` output of a batch: eager ``json.loads`` of the whole
+array vs. :py:class:`exiftool.LazyRecords` when only some of the files
+are accessed.  If ``orjson`` is installed, it is measured as a
+pluggable :py:data:`exiftool.decoder` too.
+
+    python benchmarks/bench_decode.py [files]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import exiftool  # pylint: disable=wrong-import-position
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def make_output(files, tags=200):
+    "Output of exiftool -j -G for `files` files"
+    record = "".join(',\n  "EXIF:Tag%d": "value %d"' % (i, i)
+                     for i in range(tags))
+    return ("[" + ",\n".join('{\n  "SourceFile": "IMG_%05d.JPG"%s\n}' % (
+        i, record) for i in range(files)) + "]").encode()
+
+
+def timed(func):
+    "Seconds spent in `func`, best of 3"
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def lazy(output, accessed):
+    "Split `output` and decode `accessed` files of it"
+    records = exiftool.LazyRecords.from_output(output)
+    step = max(len(records) // accessed, 1) if accessed else 0
+    for i in range(0, len(records), step or len(records) + 1):
+        records[i]  # pylint: disable=pointless-statement
+
+
+def main(files):
+    output = make_output(files)
+    print("{} files, {:.1f} MB".format(files, len(output) / 2**20))
+    decoders = [("json", json.loads)]
+    if orjson is not None:
+        decoders.append(("orjson", orjson.loads))
+    print("{:<8} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "decoder", "eager ms", "lazy 0", "lazy 1", "lazy 10%", "lazy all"))
+    for name, func in decoders:
+        exiftool.decoder = func
+        times = [timed(lambda: func(output))] + [
+            timed(lambda: lazy(output, n)) for n in (0, 1, files // 10, files)]
+        print("{:<8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            name, *(t * 1000 for t in times)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
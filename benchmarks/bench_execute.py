@@ -0,0 +1,74 @@
+"""
+Throughput of reading ``-j`` output from exiftool: the old
+``output += os.read()`` loop vs. :py:meth:`ExifTool._read_output`.
+
+A writer thread pushes a synthetic multi-megabyte JSON payload followed
+by the ``{ready}`` sentinel into a pipe, the same way exiftool does.
+
+    python benchmarks/bench_execute.py [size_mb ...]
+"""
+
+import os
+import sys
+import threading
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import exiftool  # pylint: disable=wrong-import-position
+
+
+def make_payload(size):
+    "JSON-like output of approximately `size` bytes"
+    record = (b'{\n  "SourceFile": "IMG_0001.JPG",\n' +
+              b''.join(b'  "EXIF:Tag%d": "value %d",\n' % (i, i)
+                       for i in range(50)) + b'  "EXIF:Last": 0\n},\n')
+    count = max(size // len(record), 1)
+    return b"[" + record * count + b"{}]\n" + exiftool.sentinel + b"\n"
+
+
+def legacy_read(fd):
+    "Reader loop used before the growable buffer"
+    output = b""
+    while not output[-32:].strip().endswith(exiftool.sentinel):
+        output += os.read(fd, 4096)
+    return output.strip()[:-len(exiftool.sentinel)]
+
+
+def run(payload, reader):
+    "Return seconds spent reading `payload` through a pipe with `reader`"
+    r, w = os.pipe()
+    writer = threading.Thread(target=lambda: (os.write(w, payload),
+                                              os.close(w)))
+    stdout = os.fdopen(r, "rb")
+    start = time.perf_counter()
+    writer.start()
+    result = reader(stdout)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    stdout.close()
+    assert result == payload.strip()[:-len(exiftool.sentinel)]
+    return elapsed
+
+
+def new_reader(stdout):
+    "Read with ExifTool._read_output of a fresh instance"
+    et = exiftool.ExifTool()
+    et._process = types.SimpleNamespace(stdout=stdout)  # pylint: disable=protected-access
+    return et._read_output()  # pylint: disable=protected-access
+
+
+def main(sizes):
+    print("{:>8} {:>12} {:>12} {:>8}".format("MB", "old MB/s", "new MB/s",
+                                             "speedup"))
+    for size_mb in sizes:
+        payload = make_payload(int(size_mb * 2**20))
+        mb = len(payload) / 2**20
+        old = run(payload, lambda f: legacy_read(f.fileno()))
+        new = run(payload, new_reader)
+        print("{:8.1f} {:12.1f} {:12.1f} {:7.1f}x".format(
+            mb, mb / old, mb / new, old / new))
+
+
+if __name__ == '__main__':
+    main([float(i) for i in sys.argv[1:]] or [1, 4, 16])
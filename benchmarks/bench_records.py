@@ -0,0 +1,53 @@
+"""
+Memory used by metadata of a folder as dicts vs. compact records.
+
+Synthetic metadata: files share a few tag sets (camera models) of a few
+hundred "Group:Tag" keys, values are a mix of repeated and unique ones.
+
+    python benchmarks/bench_records.py [files]
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import records  # pylint: disable=wrong-import-position
+
+
+def make_json(files, tags=300, tag_sets=5):
+    "exiftool -j like output"
+    out = []
+    for i in range(files):
+        variant = i % tag_sets
+        d = {"SourceFile": "folder/IMG_%05d.JPG" % i}
+        for t in range(tags - variant * 10):
+            group = ("EXIF", "MakerNotes", "XMP", "File")[t % 4]
+            d["%s:Tag%d" % (group, t)] = (
+                "Model %d" % variant if t % 3 else "value %d/%d" % (i, t))
+        out.append(d)
+    return json.dumps(out)
+
+
+def measure(text, convert):
+    "Bytes allocated by the result of `convert(json.loads(text))`"
+    tracemalloc.start()
+    data = convert(json.loads(text))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def main(files):
+    text = make_json(files)
+    as_dicts = measure(text, lambda x: x)
+    as_records = measure(text, records.compact)
+    print("files: %d, dicts: %.1f MB, records: %.1f MB, saved: %.0f%%" % (
+        files, as_dicts / 2**20, as_records / 2**20,
+        100 * (1 - as_records / as_dicts)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
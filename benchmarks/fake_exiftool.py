@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Stand-in for ``exiftool -stay_open True -@ -`` for benchmarks.
+
+Reads arguments from stdin, and on ``-execute[NUM]`` prints JSON in the
+layout of ``exiftool -j`` for every non-option argument (files need not
+exist) followed by ``{ready[NUM]}``.  With ``-b`` it prints a binary
+value instead.  Output is controlled by environment variables:
+
+FAKE_EXIFTOOL_TAGS        tags per file (default 200)
+FAKE_EXIFTOOL_VALUE_SIZE  characters per value (default 16)
+FAKE_EXIFTOOL_LATENCY     seconds to sleep per command (default 0)
+"""
+
+import json
+import os
+import sys
+import time
+
+TAGS = int(os.environ.get("FAKE_EXIFTOOL_TAGS", 200))
+VALUE_SIZE = int(os.environ.get("FAKE_EXIFTOOL_VALUE_SIZE", 16))
+LATENCY = float(os.environ.get("FAKE_EXIFTOOL_LATENCY", 0))
+GROUPS = "EXIF", "MakerNotes", "XMP", "File", "Composite"
+# Options followed by a value
+VALUE_OPTIONS = {"-charset", "-tagsFromFile", "-api", "-stay_open"}
+
+
+def tags_json(tags):
+    "Lines of exiftool -j -G output for the tags of a file"
+    lines = []
+    for i in range(TAGS):
+        key = "%s:Tag%d" % (GROUPS[i % len(GROUPS)], i)
+        if tags and key not in tags:
+            continue
+        value = ("%d" % i if i % 2 else "value %d" % i)
+        lines.append(",\n  %s: %s" % (json.dumps(key),
+                                      json.dumps(value.ljust(VALUE_SIZE, "x"))))
+    return "".join(lines)
+
+
+def file_json(path, body):
+    "Output of exiftool -j -G for one file"
+    return '{\n  "SourceFile": %s%s\n}' % (json.dumps(path), body)
+
+
+def run(args):
+    "Output of a command"
+    files, tags, options, skip = [], set(), set(), False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in VALUE_OPTIONS:
+            skip = True
+        elif arg.startswith("-"):
+            options.add(arg)
+            tags.add(arg[1:].partition(">")[0])
+        else:
+            files.append(arg)
+    if "-ver" in options:
+        return b"12.00\n"
+    if "-b" in options:
+        return b"\x00\xffBINARY" * max(VALUE_SIZE, 1)
+    if "-j" not in options:
+        return b"    %d image files updated\n" % len(files)
+    body = tags_json({t for t in tags if ":" in t})
+    return ("[" + ",\n".join(file_json(f, body) for f in files) +
+            "]\n").encode("utf-8")
+
+
+def main():
+    out, args = sys.stdout.buffer, []
+    for line in sys.stdin.buffer:
+        arg = line.rstrip(b"\r\n").decode("utf-8", "surrogateescape")
+        if arg.startswith("-execute"):
+            if LATENCY:
+                time.sleep(LATENCY)
+            out.write(run(args))
+            out.write(b"{ready%s}\n" % arg[len("-execute"):].encode())
+            out.flush()
+            args = []
+        elif args[-1:] == ["-stay_open"] and arg == "False":
+            return
+        else:
+            args.append(arg)
+
+
+if __name__ == '__main__':
+    main()
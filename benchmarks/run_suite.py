@@ -0,0 +1,154 @@
+"""
+Benchmark suite of the exiftool bridge and the tag view, runs against
+``fake_exiftool.py`` so neither exiftool nor images are needed.
+
+Cases:
+
+* ``execute``: MB/s of raw ``-j`` output read for a large batch
+* ``execute_json``: files/s of ``get_metadata_batch`` (read + decode)
+* ``execute_json_lazy``: the same with ``lazy=True``, one file accessed
+* ``batch`` / ``single``: files/s of one batch vs. a call per file
+* ``stream``: files/s of a batch of 50 times ``--files`` generated names
+* ``dictmodel_compare``: ms to compare two files and build the model
+* ``dictmodel_data``: µs per ``DictModel.data`` call (needs Qt)
+
+Results are printed and, with ``--json``, saved for tracking regressions.
+
+    python benchmarks/run_suite.py [--files N] [--tags N] [--value-size N]
+                                   [--latency SEC] [--repeat N] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_EXIFTOOL = os.path.join(HERE, "fake_exiftool.py")
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+import exiftool  # pylint: disable=wrong-import-position
+import metadiff  # pylint: disable=wrong-import-position
+
+
+def best_of(repeat, func):
+    "Shortest time of `repeat` calls of `func`, and its last result"
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_execute(et, files, repeat):
+    "Raw output throughput"
+    params = [b"-j", b"-G"] + [os.fsencode(i) for i in files]
+    seconds, output = best_of(repeat, lambda: et.execute(*params))
+    return [("execute", len(output) / 2**20 / seconds, "MB/s")]
+
+
+def bench_execute_json(et, files, repeat):
+    "Read and decode throughput"
+    seconds, _ = best_of(repeat, lambda: et.get_metadata_batch(files))
+    lazy, _ = best_of(repeat, lambda: et.get_metadata_batch(files,
+                                                             lazy=True)[0])
+    return [("execute_json", len(files) / seconds, "files/s"),
+            ("execute_json_lazy", len(files) / lazy, "files/s")]
+
+
+def bench_batch_single(et, files, repeat):
+    "One batch vs. a command per file"
+    files = files[:100]
+    batch, _ = best_of(repeat, lambda: et.get_metadata_batch(files))
+    single, _ = best_of(repeat, lambda: [et.get_metadata(i) for i in files])
+    return [("batch", len(files) / batch, "files/s"),
+            ("single", len(files) / single, "files/s")]
+
+
+def bench_stream(et, files, repeat):
+    "A batch too large to pass in one write, fed from a generator"
+    count = 50 * len(files)
+    seconds, _ = best_of(repeat, lambda: et.get_metadata_batch(
+        ("folder/IMG_%07d.JPG" % i for i in range(count)), lazy=True))
+    return [("stream", count / seconds, "files/s")]
+
+
+def bench_dictmodel(et, files, repeat):
+    "Comparison and model build, data() calls of the tag view"
+    left, right = et.get_metadata_batch(files[:2])
+    comparison = metadiff.Comparison()
+
+    def compare():
+        comparison.set_side(0, left)
+        comparison.set_side(1, right)
+        return comparison
+    seconds, _ = best_of(repeat, compare)
+    results = [("dictmodel_compare", seconds * 1000, "ms")]
+    try:
+        import main  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        print("skipping dictmodel_data:", e, file=sys.stderr)
+        return results
+    seconds, model = best_of(repeat, lambda: main.DictModel(comparison, 0))
+    results.append(("dictmodel_build", seconds * 1000, "ms"))
+    roles = main.Qt.DisplayRole, main.Qt.BackgroundRole, main.Qt.ToolTipRole
+    indexes = [model.index(row, col) for row in range(model.rowCount(None))
+               for col in range(2)]
+
+    def paint():
+        for index in indexes:
+            for role in roles:
+                model.data(index, role)
+    seconds, _ = best_of(repeat, paint)
+    results.append(("dictmodel_data",
+                    seconds / (len(indexes) * len(roles)) * 1e6, "us"))
+    return results
+
+
+CASES = (bench_execute, bench_execute_json, bench_batch_single, bench_stream,
+         bench_dictmodel)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=2000,
+                        help="files per batch")
+    parser.add_argument("--tags", type=int, default=200, help="tags per file")
+    parser.add_argument("--value-size", type=int, default=16,
+                        help="characters per value")
+    parser.add_argument("--latency", type=float, default=0.,
+                        help="seconds exiftool sleeps per command")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per case, the best one is reported")
+    parser.add_argument("--json", metavar="PATH",
+                        help="save results to a JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {"files": args.files, "tags": args.tags,
+              "value_size": args.value_size, "latency": args.latency,
+              "repeat": args.repeat}
+    os.environ.update(FAKE_EXIFTOOL_TAGS=str(args.tags),
+                      FAKE_EXIFTOOL_VALUE_SIZE=str(args.value_size),
+                      FAKE_EXIFTOOL_LATENCY=str(args.latency))
+    files = ["folder/IMG_%05d.JPG" % i for i in range(args.files)]
+    results = []
+    with exiftool.ExifTool(FAKE_EXIFTOOL) as et:
+        for case in CASES:
+            for name, value, unit in case(et, files, args.repeat):
+                print("{:<20} {:>12.2f} {}".format(name, value, unit))
+                results.append({"name": name, "value": value, "unit": unit})
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "config": config, "results": results}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
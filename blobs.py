@@ -0,0 +1,58 @@
+"""
+Lazy handles for binary and oversized tag values
+
+exiftool reports binary values (thumbnails, previews) as placeholder
+strings like "(Binary data 5120 bytes, use -b option to extract)", and
+some text values (XMP packets, maker notes dumps) are huge.  Both are
+replaced in metadata by small handles; the bytes are fetched with
+``exiftool -b`` only when needed, see `metacache.BlobCache`.
+"""
+
+import re
+
+BINARY_RE = re.compile(r"\(Binary data (\d+) bytes")
+MAX_VALUE_SIZE = 4096  # characters, longer text values become handles
+
+
+class BlobHandle():
+    "Stands for the value of `tag` of file `path`, fetched on demand"
+    __slots__ = ("path", "tag", "size", "binary", "digest")
+
+    def __init__(self, path, tag, size, binary, digest=None):
+        self.path, self.tag, self.size = path, tag, size
+        self.binary = binary  # False: oversized text value
+        self.digest = digest  # hash of the text value to compare handles
+
+    def __str__(self):
+        if self.binary:
+            return "(Binary data %d bytes)" % self.size
+        return "(Text %d characters)" % self.size
+
+    def __repr__(self):
+        return "BlobHandle(%r, %r, %d)" % (self.path, self.tag, self.size)
+
+    def __eq__(self, other):
+        # binary placeholders used to compare by size only, keep it
+        return isinstance(other, BlobHandle) and \
+            (self.size, self.binary, self.digest) == \
+            (other.size, other.binary, other.digest)
+
+    def __hash__(self):
+        return hash((self.size, self.binary, self.digest))
+
+
+def wrap_values(meta, max_size=MAX_VALUE_SIZE):
+    """
+    Copy of metadata `meta` with binary placeholders and text values
+    longer than `max_size` replaced by `BlobHandle`
+    """
+    path, result = meta.get("SourceFile"), {}
+    for k, v in meta.items():
+        if isinstance(v, str) and v.startswith("(Binary data "):
+            match = BINARY_RE.match(v)
+            if match:
+                v = BlobHandle(path, k, int(match.group(1)), True)
+        elif isinstance(v, str) and len(v) > max_size:
+            v = BlobHandle(path, k, len(v), False, hash(v))
+        result[k] = v
+    return result
@@ -5,9 +5,127 @@ Andrey Makarov, 2019
 
 from pathlib import Path
 import os
+import threading
+from collections import OrderedDict
 from qtpy import QtWidgets, QtGui, QtCore
 from qtpy.QtCore import Qt
 
+MENU_MAX_ITEMS = 500  # subdirectories shown in a breadcrumb menu
+LISTING_CHUNK = 100  # subdirectories added to an open menu at a time
+LISTING_CACHE = 64  # directories whose listings are kept
+
+
+class DirectoryLister(QtCore.QObject):
+    """
+    List subdirectories on a worker thread with `os.scandir`, which knows
+    entry types without a stat call per entry on most systems. Listings are
+    cached per directory while its mtime is unchanged. A new request cancels
+    the one in progress. Results are delivered in chunks of `chunk_size`;
+    listing stops after `limit` subdirectories.
+    """
+    entries = QtCore.Signal(str, list, bool)  # directory, names, first chunk
+    finished = QtCore.Signal(str, object, bool)  # directory, mtime, truncated
+    failed = QtCore.Signal(str)  # directory could not be listed
+
+    def __init__(self, parent=None, limit=MENU_MAX_ITEMS,
+                 chunk_size=LISTING_CHUNK):
+        super().__init__(parent)
+        self.limit, self.chunk_size = limit, chunk_size
+        self._cache = OrderedDict()  # path -> (mtime_ns, names, truncated)
+        self._request = None  # (path, known mtime_ns)
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="DirectoryLister")
+        self._thread.start()
+
+    def request(self, path, known_mtime=None):
+        """
+        List `path`. If its mtime is `known_mtime` only `finished` is
+        emitted, the listing the caller has is up to date
+        """
+        with self._cond:
+            self._generation += 1
+            self._request = str(path), known_mtime
+            self._cond.notify()
+
+    def cancel(self):
+        "Stop listing, nothing more is emitted for the current request"
+        with self._cond:
+            self._generation += 1
+            self._request = None
+
+    def stop(self):
+        "Stop the worker thread"
+        with self._cond:
+            self._stopped = True
+            self._request = None
+            self._cond.notify()
+        self._thread.join()
+
+    def _next(self):
+        "Wait for a request, `None` when stopped"
+        with self._cond:
+            while not (self._request or self._stopped):
+                self._cond.wait()
+            if self._stopped:
+                return None
+            request, self._request = self._request, None
+            return request + (self._generation,)
+
+    def _current(self, generation):
+        return self._generation == generation
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            path, known_mtime, generation = item
+            try:
+                self._list(path, known_mtime, generation)
+            except OSError:
+                if self._current(generation):
+                    self.failed.emit(path)
+
+    def _list(self, path, known_mtime, generation):
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._cache.get(path)
+        if cached and cached[0] == mtime:
+            self._cache.move_to_end(path)
+            if mtime != known_mtime and self._current(generation):
+                self.entries.emit(path, cached[1], True)
+            if self._current(generation):
+                self.finished.emit(path, mtime, cached[2])
+            return
+        names, chunk, truncated = [], [], False
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if not entry.is_dir():
+                        continue
+                except OSError:
+                    continue
+                if len(names) == self.limit:
+                    truncated = True
+                    break
+                names.append(entry.name)
+                chunk.append(entry.name)
+                if len(chunk) == self.chunk_size:
+                    if not self._current(generation):
+                        return  # cancelled, the partial list is not cached
+                    self.entries.emit(path, chunk, len(names) == len(chunk))
+                    chunk = []
+        self._cache[path] = mtime, names, truncated
+        while len(self._cache) > LISTING_CACHE:
+            self._cache.popitem(last=False)
+        if self._current(generation):
+            if chunk or not names:  # an empty listing clears the menu too
+                self.entries.emit(path, chunk, len(names) == len(chunk))
+            self.finished.emit(path, mtime, truncated)
+
+
 class BreadcrumbsAddressBar(QtWidgets.QFrame):
     "Windows Explorer-like address bar"
     listdir_error = QtCore.Signal(Path)  # failed to list a directory
@@ -61,6 +179,7 @@ class BreadcrumbsAddressBar(QtWidgets.QFrame):
                                              "image: none;}")
         self.btn_crumbs_hidden.setMinimumSize(self.btn_crumbs_hidden.minimumSizeHint())
         self.btn_crumbs_hidden.hide()
+        self._hidden_btn_width = self.btn_crumbs_hidden.minimumWidth()
         crumbs_cont_layout.addWidget(self.btn_crumbs_hidden)
         menu = QtWidgets.QMenu(self.btn_crumbs_hidden)  # FIXME:
         menu.aboutToShow.connect(self._hidden_crumbs_menu_show)
@@ -90,7 +209,16 @@ class BreadcrumbsAddressBar(QtWidgets.QFrame):
 
         self.setMaximumHeight(self.line_address.height())  # FIXME:
 
-        self.first_visible, self.l_breadcrumbs = 0, None
+        # Subdirectories for breadcrumb menus are listed in background
+        self.lister = DirectoryLister(self)
+        self.lister.entries.connect(self._crumb_menu_entries)
+        self.lister.finished.connect(self._crumb_menu_finished)
+        self.lister.failed.connect(self._crumb_menu_failed)
+        self._open_menu = None  # crumb menu being filled
+
+        # Breadcrumbs from the root, their widths and total visible width
+        self.first_visible, self.l_breadcrumbs = 0, []
+        self._crumb_widths, self._visible_width = [], 0
         self.path_ = None
         self.set_path(Path())
 
@@ -104,8 +232,9 @@ class BreadcrumbsAddressBar(QtWidgets.QFrame):
             action.triggered.connect(self.set_path)
 
     def _browse_for_folder(self):
+        start = getattr(self.sender(), "path", None) or self.path()
         path = QtWidgets.QFileDialog.getExistingDirectory(
-            self, "Choose folder", str(self.path()))
+            self, "Choose folder", str(start))
         if path:
             self.set_path(path)
 
@@ -123,16 +252,19 @@ class BreadcrumbsAddressBar(QtWidgets.QFrame):
         #     self.completer.model().setStringList(paths)
         self.line_address.keyPressEvent_super(event)
 
-    def _clear_crumbs(self):
+    def _truncate_crumbs(self, count):
+        "Delete breadcrumbs after the first `count` ones"
         layout = self.crumbs_panel.layout()
-        while layout.count():
-            child = layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        # self.l_crumbs_hidden, self.l_crumbs_visible = [], []  # init
-        self.first_visible, self.l_breadcrumbs = 0, []
-
-    def _insert_crumb(self, path):
+        while len(self.l_breadcrumbs) > count:
+            btn = self.l_breadcrumbs.pop()
+            width = self._crumb_widths.pop()
+            if len(self.l_breadcrumbs) >= self.first_visible:
+                self._visible_width -= width
+            layout.removeWidget(btn)
+            btn.deleteLater()
+        self.first_visible = min(self.first_visible, count)
+
+    def _append_crumb(self, path):
         btn = QtWidgets.QToolButton(self.crumbs_panel)
         btn.setAutoRaise(True)
         btn.setPopupMode(btn.MenuButtonPopup)
@@ -147,34 +279,75 @@ class BreadcrumbsAddressBar(QtWidgets.QFrame):
         # scrollable menu https://stackoverflow.com/a/14719633/1119602
         menu.setStyleSheet("QMenu { menu-scrollable: 1; }")
         btn.setMenu(menu)
-        self.crumbs_panel.layout().insertWidget(0, btn)
+        self.crumbs_panel.layout().addWidget(btn)
         btn.setMinimumSize(btn.minimumSizeHint())  # fixed size breadcrumbs
         # print(self._check_space_width(btn.minimumWidth()))
         # print(btn.size(), btn.sizeHint(), btn.minimumSizeHint())
         # self.l_crumbs_visible.insert(0, btn)
-        self.l_breadcrumbs.insert(0, btn)
+        self.l_breadcrumbs.append(btn)
+        self._crumb_widths.append(btn.minimumWidth())
+        self._visible_width += btn.minimumWidth()
 
     def crumb_clicked(self):
         "SLOT: breadcrumb was clicked"
         self.set_path(self.sender().path)
 
     def crumb_menu_show(self):
-        "SLOT: fill subdirectory list on menu open"
+        """
+        SLOT: request subdirectory list on menu open, the menu keeps
+        its items while the directory is unchanged
+        """
         menu = self.sender()
-        context_root = menu.parent().path
-        try:
-            for i in context_root.iterdir():
-                if not i.is_dir():
-                    continue
-                action = menu.addAction(i.name)
-                action.path = i
-                action.triggered.connect(self.set_path)
-        except PermissionError:
-            self.listdir_error.emit(context_root)
+        self._open_menu = menu
+        if menu.isEmpty():
+            menu.addAction("Loading\u2026").setEnabled(False)
+        self.lister.request(menu.parent().path, getattr(menu, "mtime", None))
 
     def crumb_menu_hide(self):
-        "SLOT: Clear sub-dir menu on hide but let action trigger first"
-        QtCore.QTimer.singleShot(0, self.sender().clear)
+        "SLOT: stop filling the menu"
+        self._open_menu = None
+        self.lister.cancel()
+
+    def _listed_menu(self, path):
+        "Open crumb menu of directory `path`, `None` if it was closed"
+        menu = self._open_menu
+        if menu is not None and str(menu.parent().path) == path:
+            return menu
+        return None
+
+    def _crumb_menu_entries(self, path, names, first):
+        "SLOT: add a chunk of subdirectories to the open menu"
+        menu = self._listed_menu(path)
+        if menu is None:
+            return
+        if first:
+            menu.clear()
+            menu.mtime = None  # incomplete until finished
+        parent = menu.parent().path
+        for name in names:
+            action = menu.addAction(name)
+            action.path = parent / name
+            action.triggered.connect(self.set_path)
+
+    def _crumb_menu_failed(self, path):
+        "SLOT: directory of the open menu could not be listed"
+        menu = self._listed_menu(path)
+        if menu is not None:
+            menu.clear()
+            menu.mtime = None
+        self.listdir_error.emit(Path(path))
+
+    def _crumb_menu_finished(self, path, mtime, truncated):
+        "SLOT: listing of the open menu is complete"
+        menu = self._listed_menu(path)
+        if menu is None or getattr(menu, "mtime", None) == mtime:
+            return
+        menu.mtime = mtime
+        if truncated:
+            menu.addSeparator()
+            action = menu.addAction("More\u2026")
+            action.path = menu.parent().path
+            action.triggered.connect(self._browse_for_folder)
 
     def set_path(self, path=None):
         """
@@ -193,15 +366,20 @@ class BreadcrumbsAddressBar(QtWidgets.QFrame):
         if emit_err:  # permission error or path does not exist
             emit_err.emit(path)
             return False
-        self._clear_crumbs()
         self.path_ = path
         self.line_address.setText(str(path))
-        self._insert_crumb(path)
-        while path.parent != path:
-            path = path.parent
-            self._insert_crumb(path)
+        # Breadcrumbs of the common part with the previous path are kept
+        chain = list(reversed(path.parents)) + [path]
+        common = 0
+        for btn, part in zip(self.l_breadcrumbs, chain):
+            if btn.path != part:
+                break
+            common += 1
+        self._truncate_crumbs(common)
+        for part in chain[common:]:
+            self._append_crumb(part)
         # self.l_crumbs_visible[-1].setMinimumSize(0, 0)  # FIXME: last piece is resizable?
-        QtCore.QTimer.singleShot(0, self._show_hide_breadcrumbs)
+        self._show_hide_breadcrumbs()
         return True
 
     def _cancel_edit(self):
@@ -274,31 +452,34 @@ class BreadcrumbsAddressBar(QtWidgets.QFrame):
         return self.first_visible
 
     def _show_hide_breadcrumbs(self):
-        free_space = self.switch_space.width() - round(.1 * self.width())
-        if free_space < 0 and self._vis_count() > 1:
-            if not self._hid_count():
-                free_space -= self.btn_crumbs_hidden.width()
-                self.btn_crumbs_hidden.show()
-            i, acc_width = -1, 0
-            for i in range(self._vis_count()-1):
-                widget = self.l_breadcrumbs[self.first_visible]
-                acc_width += widget.width()
-                widget.hide()
-                self.first_visible += 1
-                if acc_width + free_space >= 0:
-                    break
-        elif free_space > 0 and self._hid_count():
-            i, acc_width = -1, 0
-            for i in range(self._hid_count()-1, -1, -1):
-                widget = self.l_breadcrumbs[i]
-                acc_width += widget.width()
-                if acc_width > free_space:
-                    break
-                widget.show()
-                self.first_visible -= 1
-                if not self.first_visible:
-                    free_space += self.btn_crumbs_hidden.width()
-                    self.btn_crumbs_hidden.hide()
+        """
+        Hide breadcrumbs from the root so that at least 10% of the bar
+        stays free, or show hidden ones if there is space. Cached widths
+        are used, only breadcrumbs changing visibility are touched
+        """
+        widths, count = self._crumb_widths, len(self._crumb_widths)
+        space = self.crumbs_container.width() - round(.1 * self.width())
+        first, used = self.first_visible, self._visible_width
+        hidden_btn = self._hidden_btn_width
+        while first < count - 1 and \
+                used + (hidden_btn if first else 0) > space:
+            used -= widths[first]
+            first += 1
+        while first and \
+                used + widths[first-1] + (hidden_btn if first > 1 else 0) <= space:
+            first -= 1
+            used += widths[first]
+        if first > 1:  # all of the rest may fit without the hidden button
+            rest = used
+            for i in range(first):
+                rest += widths[i]
+            if rest <= space:
+                first, used = 0, rest
+        for i in range(min(first, self.first_visible),
+                       max(first, self.first_visible)):
+            self.l_breadcrumbs[i].setVisible(i >= first)
+        self.btn_crumbs_hidden.setVisible(first > 0)
+        self.first_visible, self._visible_width = first, used
 
     # def _show_hide_breadcrumbs(self):
     #     free_space = self.switch_space.width() - round(.1 * self.width())
@@ -0,0 +1,269 @@
+"""
+exifdiff command line: compare metadata of files without GUI
+
+    python cli.py files A.jpg B.jpg
+    python cli.py --format ndjson --jobs 4 lists left.txt right.txt
+    python cli.py --format csv reference --ref R1.jpg --ref R2.jpg *.jpg
+    python cli.py --format ndjson tree old_library new_library --resume j.txt
+
+`lists` pairs files of two text files (one path per line) line by line.
+`reference` compares every file to a reference set: a tag differs if
+its value is not one of the values of the reference files; the file is
+reported as "right" and reference values as "left".
+`tree` pairs files of two directory trees by relative path; a file
+existing on one side only has the other side `null`.  With `--resume`
+finished pairs are recorded in a journal and skipped when the command
+is run again, output is appended.
+Only differences are reported.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+import exiftool
+import metadiff
+import treediff
+
+DEFAULT_IGNORE = ("SourceFile",)
+BATCH_PAIRS = 500  # pairs loaded per exiftool batch
+
+
+class Stats():
+    "Timing summary for --stats"
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.extract = self.compare = 0.
+        self.files = self.pairs = self.differences = 0
+
+    def report(self, stream):
+        total = time.perf_counter() - self.started
+        stream.write(
+            "files: %d, pairs: %d, differences: %d\n"
+            "extract: %.3fs, compare: %.3fs, total: %.3fs, %.1f files/s\n" % (
+                self.files, self.pairs, self.differences, self.extract,
+                self.compare, total, self.files / total if total else 0))
+
+
+class TimedSource():
+    "Counts files and time of `get_metadata_batch` calls for Stats"
+    def __init__(self, source, stats):
+        self.source, self.stats = source, stats
+
+    def get_metadata_batch(self, filenames):
+        started = time.perf_counter()
+        result = self.source.get_metadata_batch(filenames)
+        self.stats.extract += time.perf_counter() - started
+        self.stats.files += len(filenames)
+        return result
+
+
+def read_list(path):
+    "Non-empty lines of a text file"
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\r\n") for line in f if line.strip()]
+
+
+def load(source, files, stats):
+    "Metadata of `files` in one batch: {normalized path: metadata}"
+    files = list(dict.fromkeys(files))
+    return metadiff.by_source_file(
+        TimedSource(source, stats).get_metadata_batch(files))
+
+
+def diff_pairs(source, pairs, ignore, stats):
+    "Yield (left, right, differences) for pairs of file paths"
+    for i in range(0, len(pairs), BATCH_PAIRS):
+        batch = pairs[i:i+BATCH_PAIRS]
+        metas = load(source, [f for pair in batch for f in pair], stats)
+        started = time.perf_counter()
+        results = [(a, b, metadiff.diff(metas.get(metadiff.normpath(a)),
+                                         metas.get(metadiff.normpath(b)),
+                                         ignore))
+                   for a, b in batch]
+        stats.compare += time.perf_counter() - started
+        yield from results
+
+
+def diff_reference(source, files, references, ignore, stats):
+    """
+    Yield (None, file, differences) of files compared to a reference set,
+    left values are reference values
+    """
+    refs = load(source, references, stats)
+    allowed = {}  # tag -> values of reference files (`None`: missing)
+    for meta in refs.values():
+        for k in meta:
+            allowed.setdefault(k, [])
+    for meta in refs.values():
+        for k, values in allowed.items():
+            value = meta.get(k)
+            if value not in values:
+                values.append(value)
+    for i in range(0, len(files), BATCH_PAIRS):
+        batch = files[i:i+BATCH_PAIRS]
+        metas = load(source, batch, stats)
+        started = time.perf_counter()
+        results = []
+        for path in batch:
+            meta = metas.get(metadiff.normpath(path)) or {}
+            differences = []
+            for k in sorted(set(allowed).union(meta)):
+                value = meta.get(k)
+                if k in ignore or value in allowed.get(k, (None,)):
+                    continue
+                status = metadiff.RIGHT_ONLY if k not in allowed else \
+                    metadiff.LEFT_ONLY if value is None else metadiff.CHANGED
+                expected = allowed.get(k)
+                differences.append((k, expected[0] if expected and
+                                    len(expected) == 1 else expected,
+                                    value, status))
+            results.append((None, path, differences))
+        stats.compare += time.perf_counter() - started
+        yield from results
+
+
+def csv_value(value):
+    "Text of a value in a CSV cell"
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def as_records(differences):
+    return [{"tag": k, "left": lv, "right": rv,
+             "status": metadiff.STATUS_NAMES[status]}
+            for k, lv, rv, status in differences]
+
+
+def diff_tree(source, left, right, ignore, stats, journal, stream):
+    """
+    Yield (left, right, differences) of files of two trees.
+    With `journal` a pair is recorded once its result is written
+    """
+    done = journal.done if journal else ()
+    for rel, a, b, differences in treediff.diff_trees(
+            TimedSource(source, stats), left, right, ignore, done):
+        yield a, b, differences
+        if journal:  # the consumer has written the result
+            stream.flush()
+            journal.record(rel)
+
+
+def write_results(results, fmt, stream, stats, header=True):
+    "Stream results in `fmt`: json, ndjson or csv"
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        if header:
+            writer.writerow(("left_file", "right_file", "tag", "left",
+                             "right", "status"))
+    elif fmt == "json":
+        stream.write("[")
+    for n, (left, right, differences) in enumerate(results):
+        stats.pairs += 1
+        stats.differences += len(differences)
+        if fmt == "csv":
+            for i in as_records(differences):
+                writer.writerow((left or "", right or "", i["tag"],
+                                 csv_value(i["left"]), csv_value(i["right"]),
+                                 i["status"]))
+        else:
+            text = json.dumps({"left": left, "right": right,
+                               "differences": as_records(differences)})
+            if fmt == "ndjson":
+                stream.write(text + "\n")
+            else:
+                stream.write((",\n" if n else "\n") + text)
+    if fmt == "json":
+        stream.write("\n]\n")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="exifdiff", description="Compare metadata of files")
+    parser.add_argument("--format", choices=("json", "ndjson", "csv"),
+                        default="json")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="exiftool processes to run in parallel")
+    parser.add_argument("--ignore", action="append", default=[],
+                        metavar="TAG", help="tag to skip, can be repeated")
+    parser.add_argument("--stats", action="store_true",
+                        help="print timing summary to stderr")
+    parser.add_argument("--output", "-o", help="output file (stdout)")
+    parser.add_argument("--exiftool", help="exiftool executable")
+    parser.add_argument("--timeout", type=float, metavar="SEC",
+                        help="restart exiftool if a batch takes longer")
+    parser.add_argument("--hedge-after", type=float, metavar="SEC",
+                        help="with --jobs, also send a batch to a spare "
+                        "exiftool if it takes longer")
+    modes = parser.add_subparsers(dest="mode", required=True)
+    files = modes.add_parser("files", help="compare two files")
+    files.add_argument("left")
+    files.add_argument("right")
+    lists = modes.add_parser("lists", help="compare two lists pairwise")
+    lists.add_argument("left", help="text file with one path per line")
+    lists.add_argument("right", help="text file with one path per line")
+    ref = modes.add_parser("reference",
+                           help="compare files against a reference set")
+    ref.add_argument("--ref", action="append", required=True,
+                     help="reference file, can be repeated")
+    ref.add_argument("files", nargs="+")
+    tree = modes.add_parser("tree", help="compare two directory trees")
+    tree.add_argument("left")
+    tree.add_argument("right")
+    tree.add_argument("--resume", metavar="JOURNAL",
+                      help="record finished pairs, skip them on rerun")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ignore = set(DEFAULT_IGNORE).union(args.ignore)
+    if args.jobs > 1:
+        source = exiftool.ExifToolPool(args.jobs, args.exiftool,
+                                       timeout=args.timeout,
+                                       hedge_after=args.hedge_after)
+    else:
+        source = exiftool.ExifTool(args.exiftool, timeout=args.timeout)
+    stats = Stats()
+    journal = None
+    if getattr(args, "resume", None):
+        if args.format == "json":
+            sys.exit("exifdiff: --resume requires ndjson or csv format")
+        journal = treediff.Journal(args.resume)
+    resuming = journal is not None and bool(journal.done)
+    stream = open(args.output, "a" if resuming else "w", encoding="utf-8",
+                  newline="") if args.output else sys.stdout
+    with source:
+        if args.mode == "tree":
+            results = diff_tree(source, args.left, args.right, ignore,
+                                stats, journal, stream)
+        elif args.mode == "reference":
+            results = diff_reference(source, args.files, args.ref, ignore,
+                                     stats)
+        else:
+            if args.mode == "files":
+                pairs = [(args.left, args.right)]
+            else:
+                left, right = read_list(args.left), read_list(args.right)
+                if len(left) != len(right):
+                    sys.exit("exifdiff: lists have different length: "
+                             "%d, %d" % (len(left), len(right)))
+                pairs = list(zip(left, right))
+            results = diff_pairs(source, pairs, ignore, stats)
+        try:
+            write_results(results, args.format, stream, stats,
+                          header=not resuming)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+            if journal:
+                journal.close()
+    if args.stats:
+        stats.report(sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Folder-wide tag x file matrix of metadata
+
+Values of every tag are dictionary-encoded: `values[t]` lists distinct
+values of tag `t` and `codes[t, f]` is the position of the value of file
+`f` in that list, `MISSING` if the file doesn't have the tag. Questions
+about the whole folder become vectorised operations on `codes`.
+
+Requires NumPy (`pip install numpy`), unlike the rest of exifdiff; only
+the matrix window of the GUI imports this module.
+"""
+
+import json
+import numpy as np
+
+MISSING = -1  # code of a tag absent in a file
+IGNORED_TAGS = {"SourceFile"}
+CHUNK_SIZE = 256  # files per exiftool call when loading
+
+
+def _hashable(value):
+    "Dictionary key for a value, exiftool returns lists for some tags"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+class DiffMatrix():
+    "Columnar tag x file matrix of value codes"
+    def __init__(self, files, metas):
+        "`metas` are metadata mappings of `files` (`None` if not loaded)"
+        self.files = list(files)
+        index, self.tags, self.values = {}, [], []
+        encoders = []  # per tag: hashable value -> code
+        cells = []  # (tag, file, code)
+        for f, meta in enumerate(metas):
+            for k, v in (meta or {}).items():
+                if k in IGNORED_TAGS:
+                    continue
+                t = index.get(k)
+                if t is None:
+                    t = index[k] = len(self.tags)
+                    self.tags.append(k)
+                    self.values.append([])
+                    encoders.append({})
+                key = _hashable(v)
+                code = encoders[t].get(key)
+                if code is None:
+                    code = encoders[t][key] = len(self.values[t])
+                    self.values[t].append(v)
+                cells.append((t, f, code))
+        self.codes = np.full((len(self.tags), len(self.files)), MISSING,
+                             dtype=np.int32)
+        if cells:
+            t, f, code = np.array(cells, dtype=np.int32).T
+            self.codes[t, f] = code
+        self.tag_index = index
+
+    @classmethod
+    def load(cls, source, files, progress=None):
+        """
+        Load metadata of `files` with batched `source.get_metadata_batch`
+        calls (ExifTool, ExifToolPool or MetadataCache).
+        `progress(done, total)` is called after every batch
+        """
+        files, metas = list(files), []
+        for i in range(0, len(files), CHUNK_SIZE):
+            metas.extend(source.get_metadata_batch(files[i:i+CHUNK_SIZE]))
+            if progress:
+                progress(len(metas), len(files))
+        return cls(files, metas)
+
+    @property
+    def shape(self):
+        "(tags, files)"
+        return self.codes.shape
+
+    def value(self, t, f):
+        "Value of tag `t` in file `f`, `None` if missing"
+        code = self.codes[t, f]
+        return None if code == MISSING else self.values[t][code]
+
+    def varying(self):
+        "Boolean mask of tags whose value (or presence) differs among files"
+        if not self.files:
+            return np.zeros(len(self.tags), dtype=bool)
+        return (self.codes != self.codes[:, :1]).any(axis=1)
+
+    def varying_tags(self):
+        "Names of tags which differ among files"
+        return [self.tags[t] for t in np.flatnonzero(self.varying())]
+
+    def deviations(self, reference):
+        """
+        Boolean tag x file mask of values differing from file `reference`
+        (an index), and count of differing tags per file
+        """
+        mask = self.codes != self.codes[:, reference:reference+1]
+        return mask, mask.sum(axis=0)
+
+    def groups(self, tags=None):
+        """
+        Group files by identical values of `tags` (names, all by default).
+        Returns array of group numbers per file and number of groups
+        """
+        rows = self.codes if tags is None else \
+            self.codes[[self.tag_index[k] for k in tags]]
+        if not self.files:
+            return np.zeros(0, dtype=np.intp), 0
+        if not len(rows):
+            return np.zeros(len(self.files), dtype=np.intp), 1
+        unique, inverse = np.unique(rows.T, axis=0, return_inverse=True)
+        return inverse.reshape(-1), len(unique)
@@ -58,15 +58,34 @@ from __future__ import unicode_literals
 import sys
 import subprocess
 import os
+import select
 import json
 import warnings
 import codecs
+import threading
+import itertools
+import time
+import bisect
+import collections
+import re
+from concurrent.futures import ThreadPoolExecutor, Future, wait, \
+    FIRST_COMPLETED, CancelledError
+from concurrent.futures import TimeoutError as FutureTimeout
+
+if os.name == "nt":
+    import ctypes
+    import msvcrt
 
 try:        # Py3k compatibility
     basestring
 except NameError:
     basestring = (bytes, str)
 
+try:
+    import collections.abc as collectionsabc
+except ImportError:
+    collectionsabc = collections
+
 executable = "exiftool"
 """The name of the executable to run.
 
@@ -78,10 +97,55 @@ If the executable is not located in one of the paths listed in the
 # The standard value should be fine.
 sentinel = b"{ready}"
 
-# The block size when reading from exiftool.  The standard value
-# should be fine, though other values might give better performance in
-# some cases.
+# The initial block size when reading from exiftool.  The standard
+# value should be fine, though other values might give better
+# performance in some cases.  The block size is doubled every time a
+# read fills the whole block, up to ``max_block_size``, so that large
+# outputs are read in few system calls.
 block_size = 4096
+max_block_size = 1 << 20
+
+# Named tag profiles for the ``profile`` argument of the meta-data
+# methods.  A profile lists the tags or groups to extract, in the
+# format <group>:<tag>, ``all`` as tag name selects a whole group.
+# ``None`` extracts all tags.  Smaller profiles let ``exiftool`` skip
+# most of the output formatting, especially for MakerNotes.
+profiles = {
+    "all": None,
+    "capture": ["File:FileType", "File:FileSize", "File:FileModifyDate",
+                "EXIF:Make", "EXIF:Model", "EXIF:LensModel",
+                "EXIF:DateTimeOriginal", "EXIF:OffsetTimeOriginal",
+                "EXIF:ExposureTime", "EXIF:FNumber", "EXIF:ISO",
+                "EXIF:ExposureProgram", "EXIF:ExposureCompensation",
+                "EXIF:MeteringMode", "EXIF:Flash", "EXIF:FocalLength",
+                "EXIF:FocalLengthIn35mmFormat", "EXIF:WhiteBalance",
+                "EXIF:Orientation", "EXIF:ImageWidth", "EXIF:ImageHeight",
+                "Composite:ImageSize", "Composite:Megapixels"],
+    "gps": ["GPS:all", "Composite:GPSPosition", "Composite:GPSDateTime"],
+}
+
+# Commands with more parameters, or with parameters from an iterator,
+# are written by a separate thread while the output is read, so neither
+# side can block the other when a pipe is full.  The parameters are
+# consumed as the pipe accepts them instead of being joined in memory.
+stream_params = 256
+
+# Per-file cost used by :py:class:`ExifToolPool` when balancing chunks,
+# in bytes of file size.  Accounts for the overhead of opening a file
+# and formatting its output regardless of the file's size.
+file_overhead = 1 << 16
+
+# The function decoding JSON output, called with ``bytes``.  Any
+# drop-in replacement of ``json.loads`` accepting ``bytes`` works, e.g.
+# ``orjson.loads``.
+decoder = json.loads
+
+# Bytes that exiftool may print around the sentinel.
+_whitespace = b" \t\r\n"
+
+# End of one object and start of the next one in ``-j`` output.  Nested
+# objects are indented, so only top-level objects close at line start.
+_json_boundary = re.compile(br"\n\},\r?\n\{")
 
 # This code has been adapted from Lib/os.py in the Python source tree
 # (sha1 265e36e277f3)
@@ -112,6 +176,312 @@ def _fscodec():
 fsencode = _fscodec()
 del _fscodec
 
+
+def _wait_readable(stream, timeout):
+    """Wait up to ``timeout`` seconds for data or end of file on a pipe.
+
+    Returns ``False`` if the time ran out.
+    """
+    if os.name != "nt":
+        return bool(select.select([stream], [], [], max(timeout, 0))[0])
+    # select() doesn't work with pipes on Windows, poll the pipe instead
+    handle = msvcrt.get_osfhandle(stream.fileno())
+    available = ctypes.c_ulong(0)
+    deadline, delay = time.perf_counter() + timeout, .001
+    while True:
+        if not ctypes.windll.kernel32.PeekNamedPipe(
+                handle, None, 0, None, ctypes.byref(available), None) or \
+                available.value:
+            return True  # data, or an error the next read will report
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(2 * delay, .05)
+
+def _line_ending(buf, stop, start=0):
+    "Index after the line ending at ``start`` of ``buf``, if there is one"
+    if buf.startswith(b"\r\n", start, stop):
+        return start + 2
+    if buf.startswith(b"\n", start, stop):
+        return start + 1
+    return start
+
+class Instrumentation(object):
+    """Counters and latency histograms of ``exiftool`` commands.
+
+    Every :py:class:`ExifTool` instance has one in its ``stats``
+    attribute; instances of an :py:class:`ExifToolPool` share one.
+    Each command is split into phases, in seconds:
+
+    ``queue``
+        waiting for a process (pool) or for the pipe (pipelined mode)
+    ``write``
+        writing the command to ``exiftool``
+    ``wait``
+        from the end of writing until the first output arrives
+    ``read``
+        reading the rest of the output
+    ``parse``
+        decoding JSON output
+    ``total``
+        all of the above
+
+    Besides commands and bytes, :py:attr:`counters` include commands
+    that timed out, restarts of ``exiftool`` processes and hedged
+    chunks of an :py:class:`ExifToolPool`.
+
+    Every phase has a cumulative histogram with upper bounds
+    :py:attr:`buckets`.  Functions added with :py:meth:`add_hook()`
+    are called with a dictionary of the phases and byte counts of every
+    command, e.g. to forward them to a metrics system.  If
+    ``export_path`` is set, :py:meth:`export_text()` is written to it
+    at most every ``export_interval`` seconds.
+    """
+
+    buckets = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5.,
+               10., float("inf"))
+    phases = ("queue", "write", "wait", "read", "parse", "total")
+    counters = ("commands", "bytes_written", "bytes_read", "reads",
+                "timeouts", "restarts", "hedges")
+
+    def __init__(self, recent=256, export_path=None, export_interval=1.):
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self._lock = threading.Lock()
+        self._hooks = []
+        self._exported = 0
+        self.reset(recent)
+
+    def reset(self, recent=256):
+        """Zero all counters and histograms."""
+        with self._lock:
+            self._counts = dict.fromkeys(self.counters, 0)
+            self._hist = {p: [0] * len(self.buckets) for p in self.phases}
+            self._sums = dict.fromkeys(self.phases, 0.)
+            self._recent = collections.deque(maxlen=recent)
+
+    def add_hook(self, hook):
+        """Call ``hook(sample)`` after every command."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def count(self, counter, n=1):
+        """Add ``n`` to ``counter``, e.g. ``timeouts``."""
+        with self._lock:
+            self._counts[counter] += n
+
+    def observe(self, phase, seconds):
+        """Add a single duration to the histogram of ``phase``."""
+        with self._lock:
+            self._observe(phase, seconds)
+
+    def _observe(self, phase, seconds):
+        self._hist[phase][bisect.bisect_left(self.buckets, seconds)] += 1
+        self._sums[phase] += seconds
+
+    def commit(self, record):
+        """Account a command from the timestamps of ``record``.
+
+        ``record`` has ``perf_counter()`` timestamps ``started``,
+        ``written``, ``first_read``, ``finished`` and optionally
+        ``queued`` (before ``started``) and ``parsed``, and counters
+        ``bytes_written``, ``bytes_read`` and ``reads``.
+        """
+        started = record.get("queued", record["started"])
+        finished = record["finished"]
+        first_read = record.get("first_read", finished)
+        sample = {
+            "queue": record["started"] - started,
+            "write": record["written"] - record["started"],
+            "wait": max(first_read - record["written"], 0.),
+            "read": finished - first_read,
+            "parse": record.get("parsed", finished) - finished,
+        }
+        sample["total"] = record.get("parsed", finished) - started
+        for key in self.counters[1:4]:
+            sample[key] = record.get(key, 0)
+        with self._lock:
+            self._counts["commands"] += 1
+            for key in self.counters[1:4]:
+                self._counts[key] += sample[key]
+            for phase in self.phases:
+                self._observe(phase, sample[phase])
+            self._recent.append(sample["total"])
+        # Failing statistics must not fail the command they account
+        for hook in self._hooks:
+            try:
+                hook(sample)
+            except Exception as e:
+                warnings.warn("Instrumentation hook %r failed: %r"
+                              % (hook, e))
+        if self.export_path and \
+                finished - self._exported >= self.export_interval:
+            self._exported = finished
+            try:
+                self.write_text(self.export_path)
+            except OSError as e:
+                warnings.warn("Instrumentation export to %s failed: %s"
+                              % (self.export_path, e))
+
+    def snapshot(self):
+        """Return a copy of counters, histograms and sums of phases."""
+        with self._lock:
+            result = dict(self._counts)
+            result["histograms"] = {p: list(h) for p, h in self._hist.items()}
+            result["seconds"] = dict(self._sums)
+            result["buckets"] = self.buckets
+            return result
+
+    def rolling(self):
+        """Return percentiles of the total latency of recent commands.
+
+        The result is a dictionary with keys ``count``, ``p50``,
+        ``p95`` and ``max`` in seconds; ``None`` if there were no
+        commands yet.
+        """
+        with self._lock:
+            recent = sorted(self._recent)
+        if not recent:
+            return None
+        return {"count": len(recent),
+                "p50": recent[len(recent) // 2],
+                "p95": recent[min(int(len(recent) * .95), len(recent) - 1)],
+                "max": recent[-1]}
+
+    def export_text(self, prefix="exiftool"):
+        """Return the statistics in the Prometheus text format."""
+        snap = self.snapshot()
+        lines = []
+        for key in self.counters:
+            lines.append("# TYPE %s_%s_total counter" % (prefix, key))
+            lines.append("%s_%s_total %d" % (prefix, key, snap[key]))
+        name = prefix + "_phase_seconds"
+        lines.append("# TYPE %s histogram" % name)
+        for phase in self.phases:
+            cumulative = 0
+            for bound, count in zip(self.buckets, snap["histograms"][phase]):
+                cumulative += count
+                lines.append('%s_bucket{phase="%s",le="%s"} %d' % (
+                    name, phase, "+Inf" if bound == float("inf") else bound,
+                    cumulative))
+            lines.append('%s_sum{phase="%s"} %f' % (
+                name, phase, snap["seconds"][phase]))
+            lines.append('%s_count{phase="%s"} %d' % (name, phase, cumulative))
+        return "\n".join(lines) + "\n"
+
+    def write_text(self, path):
+        """Atomically write :py:meth:`export_text()` to ``path``."""
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "w") as f:
+            f.write(self.export_text())
+        os.replace(tmp, path)
+
+
+class LazyRecords(collectionsabc.Sequence):
+    """Sequence of the dictionaries of ``-j`` output decoded on access.
+
+    The output is split into the JSON text of every file without
+    decoding it, and the text of a file is decoded with
+    :py:data:`decoder` when its dictionary is first accessed.  The
+    decoded dictionary is kept, so it is the same object on every
+    access.  :py:meth:`raw()` returns the undecoded text of a file.
+    """
+
+    __slots__ = ("_raw", "_items")
+
+    def __init__(self, raw, items=None):
+        self._raw = raw
+        self._items = [None] * len(raw) if items is None else items
+
+    @classmethod
+    def from_output(cls, output):
+        """Split the output of ``exiftool -j``.
+
+        Top-level objects are separated by ``},`` and ``{`` on lines of
+        their own, nested ones are indented.  Output of a single file or
+        of an unexpected layout is decoded eagerly.
+        """
+        end = len(output)
+        while end and output[end - 1] in _whitespace:
+            end -= 1
+        if not end:
+            return cls([])
+        raw, start = [], 1
+        if output.startswith(b"[{") and output.endswith(b"}]", 0, end):
+            for match in _json_boundary.finditer(output, 0, end):
+                raw.append(output[start:match.start() + 2])
+                start = match.end() - 1
+        if not raw:
+            items = decoder(output)
+            return cls([None] * len(items), items)
+        raw.append(output[start:end - 1])
+        return cls(raw)
+
+    @classmethod
+    def join(cls, parts):
+        """Concatenate several instances without decoding them."""
+        raw, items = [], []
+        for part in parts:
+            raw.extend(part._raw)
+            items.extend(part._items)
+        return cls(raw, items)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = self._items[index]
+        if item is None:
+            item = self._items[index] = decoder(self._raw[index])
+        return item
+
+    def raw(self, index):
+        """The JSON text of the file at ``index`` as ``bytes``."""
+        raw = self._raw[index]
+        if raw is None:
+            raw = json.dumps(self._items[index]).encode("utf-8")
+        return raw
+
+    def decoded(self):
+        """The number of dictionaries decoded so far."""
+        return len(self._items) - self._items.count(None)
+
+
+class _CommandWriter(threading.Thread):
+    """Thread writing a command while its output is read.
+
+    Writes block while the pipe is full, so parameters are taken from
+    an iterator only as fast as ``exiftool`` reads them.  If taking a
+    parameter fails, the process is killed so the reader doesn't wait
+    for output that never comes, and the error is kept in ``error``.
+    """
+
+    def __init__(self, exiftool_, process, params, tail, record):
+        super(_CommandWriter, self).__init__(name="ExifTool writer")
+        self.daemon = True
+        self.exiftool = exiftool_
+        self.process, self.params, self.tail = process, params, tail
+        self.record = record
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.record["bytes_written"] = self.exiftool._write_command(
+                self.process.stdin, self.params, self.tail)
+            self.record["written"] = time.perf_counter()
+        except OSError:  # the reader sees the process exit
+            pass
+        except Exception as e:  # pylint: disable=broad-except
+            self.error = e
+            self.process.kill()
+
+
 class ExifTool(object):
     """Run the `exiftool` command-line tool and communicate to it.
 
@@ -142,18 +512,27 @@ class ExifTool(object):
        non-existent files to any of the methods, since this will lead
        to undefied behaviour.
 
+    A command that takes longer than ``timeout`` seconds (``None``
+    waits forever) raises ``TimeoutError``.  The process is then
+    considered wedged and replaced with a fresh one, as is a process
+    that has exited, so later commands are not affected.
+
     .. py:attribute:: running
 
        A Boolean value indicating whether this instance is currently
        associated with a running subprocess.
     """
 
-    def __init__(self, executable_=None):
+    def __init__(self, executable_=None, stats=None, timeout=None):
         if executable_ is None:
             self.executable = executable
         else:
             self.executable = executable_
         self.running = False
+        self.stats = Instrumentation() if stats is None else stats
+        self.timeout = timeout
+        self._last_output_size = 0
+        self._queued = None  # time the next command was queued, by a pool
 
     def start(self):
         """Start an ``exiftool`` process in batch mode for this instance.
@@ -166,14 +545,61 @@ class ExifTool(object):
         if self.running:
             warnings.warn("ExifTool already running; doing nothing.")
             return
-        with open(os.devnull, "w") as devnull:
-            self._process = subprocess.Popen(
-                [self.executable, "-stay_open", "True",  "-@", "-",
-                 "-common_args", "-G", "-n"],
-                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                stderr=devnull)
+        self._spawn()
         self.running = True
 
+    def _spawn(self):
+        "Launch the process and the thread keeping the tail of its stderr"
+        self._process = subprocess.Popen(
+            [self.executable, "-stay_open", "True",  "-@", "-",
+             "-common_args", "-G", "-n"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self._stderr = collections.deque(maxlen=20)
+        self._newline_pending = False  # of the last sentinel, see raw output
+        self._stderr_reader = threading.Thread(
+            target=self._stderr.extend, args=(self._process.stderr,),
+            name="ExifTool stderr")
+        self._stderr_reader.daemon = True
+        self._stderr_reader.start()
+
+    def _close(self, kill=False):
+        "Stop the process, return the last line it wrote to stderr"
+        process = self._process
+        try:
+            if kill:
+                process.kill()
+            else:
+                process.stdin.write(b"-stay_open\nFalse\n")
+                process.stdin.flush()
+        except OSError:  # exited already
+            pass
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        process.stdout.read()
+        process.wait()
+        process.stdout.close()
+        if not sys.is_finalizing():  # the stderr thread is frozen then
+            self._stderr_reader.join()
+            process.stderr.close()
+        return self._stderr[-1].decode("utf-8", "replace").strip() \
+            if self._stderr else ""
+
+    def _restart(self, process):
+        """Replace a dead or wedged ``process`` with a new one.
+
+        Returns the last line of its stderr.  Does nothing if the
+        process was replaced already.
+        """
+        if process is not self._process:
+            return ""
+        error = self._close(kill=True)
+        self.stats.count("restarts")
+        self._spawn()
+        return error
+
     def terminate(self):
         """Terminate the ``exiftool`` process of this instance.
 
@@ -181,9 +607,7 @@ class ExifTool(object):
         """
         if not self.running:
             return
-        self._process.stdin.write(b"-stay_open\nFalse\n")
-        self._process.stdin.flush()
-        self._process.communicate()
+        self._close()
         del self._process
         self.running = False
 
@@ -197,7 +621,7 @@ class ExifTool(object):
     def __del__(self):
         self.terminate()
 
-    def execute(self, *params):
+    def execute(self, *params, timeout=None, raw=False):
         """Execute the given batch of parameters with ``exiftool``.
 
         This method accepts any number of parameters and sends them to
@@ -207,26 +631,162 @@ class ExifTool(object):
         automatically; see the documentation of :py:meth:`start()` for
         the common options.  The ``exiftool`` output is read up to the
         end-of-output sentinel and returned as a raw ``bytes`` object,
-        excluding the sentinel.
+        excluding the sentinel.  Whitespace around the output is
+        removed, unless ``raw`` is true, which is needed to keep values
+        printed with ``-b`` intact.
 
         The parameters must also be raw ``bytes``, in whatever
         encoding exiftool accepts.  For filenames, this should be the
         system's filesystem encoding.
 
+        ``timeout`` in seconds overrides the ``timeout`` of the
+        instance for this command.  If it expires, ``TimeoutError`` is
+        raised and the process is restarted.  If the process exits,
+        ``IOError`` is raised and the process is restarted.
+
         .. note:: This is considered a low-level method, and should
            rarely be needed by application developers.
         """
+        output, record = self._execute(params, timeout, raw)
+        self.stats.commit(record)
+        return output
+
+    def _deadline(self, timeout):
+        "perf_counter() time by which a command must be finished"
+        if timeout is None:
+            timeout = self.timeout
+        return None if timeout is None else time.perf_counter() + timeout
+
+    def _failed(self, process, error):
+        "Restart after `error` of a command, return the error to raise"
+        if isinstance(error, TimeoutError):
+            self.stats.count("timeouts")
+            self._restart(process)
+            return error
+        stderr = self._restart(process)
+        return IOError("exiftool process exited%s" % (
+            ": " + stderr if stderr else "."))
+
+    def _execute(self, params, timeout=None, raw=False):
+        """Run a command, return its output and timing record.
+
+        See :py:class:`Instrumentation` for the fields of the record.
+        """
         if not self.running:
             raise ValueError("ExifTool instance not running.")
-        self._process.stdin.write(b"\n".join(params + (b"-charset\nfilename=utf8\n-execute\n",)))
-        self._process.stdin.flush()
-        output = b""
-        fd = self._process.stdout.fileno()
-        while not output[-32:].strip().endswith(sentinel):
-            output += os.read(fd, block_size)
-        return output.strip()[:-len(sentinel)]
-
-    def execute_json(self, *params):
+        record = {"started": time.perf_counter()}
+        if self._queued is not None:
+            record["queued"], self._queued = self._queued, None
+        deadline = self._deadline(timeout)
+        if self._process.poll() is not None:  # exited while idle
+            self._restart(self._process)
+        process = self._process
+        tail = b"-charset\nfilename=utf8\n-execute\n"
+        if isinstance(params, tuple) and len(params) <= stream_params:
+            try:
+                record["bytes_written"] = self._write_command(
+                    process.stdin, params, tail)
+                record["written"] = time.perf_counter()
+                output = self._read_output(record, deadline, raw)
+            except OSError as e:  # includes TimeoutError
+                raise self._failed(process, e)
+        else:
+            writer = _CommandWriter(self, process, params, tail, record)
+            try:
+                output = self._read_output(record, deadline, raw)
+            except OSError as e:
+                error = self._failed(process, e)
+                writer.join()
+                raise writer.error or error
+            writer.join()
+        record["finished"] = time.perf_counter()
+        return output, record
+
+    @staticmethod
+    def _write_command(stdin, params, tail):
+        """Write parameters and the ``-execute`` ``tail`` of a command.
+
+        ``params`` is a tuple or any iterable of ``bytes``.  Returns
+        the number of bytes written.
+        """
+        if isinstance(params, tuple) and len(params) <= stream_params:
+            data = b"\n".join(params + (tail,))
+            stdin.write(data)
+            stdin.flush()
+            return len(data)
+        size = len(tail)
+        for param in params:
+            stdin.write(param)
+            stdin.write(b"\n")
+            size += len(param) + 1
+        stdin.write(tail)
+        stdin.flush()
+        return size
+
+    def _read_output(self, record=None, deadline=None, raw=False):
+        """Read the output of a command up to the sentinel.
+
+        The output is read into a single growable buffer.  Only the
+        tail of the buffer is checked for the sentinel after each read,
+        so the cost is linear in the size of the output.  The size of
+        the previous output is remembered and used as the initial
+        capacity of the buffer for the next command.
+
+        The time of the first read, the number of reads and of bytes
+        read are stored in ``record`` if given.  ``TimeoutError`` is
+        raised if the output isn't complete at ``deadline``, a
+        ``perf_counter()`` time.
+
+        Whitespace around the output is removed.  With ``raw`` only the
+        line ending of the previous sentinel is, if it wasn't read with
+        that sentinel.
+        """
+        stdout = self._process.stdout.raw
+        readinto = stdout.readinto
+        capacity = max(min(self._last_output_size, 16 * max_block_size),
+                       block_size)
+        buf = bytearray(capacity)
+        view = memoryview(buf)
+        size, end, reads = block_size, 0, 0
+        try:
+            while True:
+                if end + size > capacity:
+                    view.release()
+                    capacity = max(2 * capacity, end + size)
+                    buf.extend(bytes(capacity - len(buf)))
+                    view = memoryview(buf)
+                if deadline is not None and not _wait_readable(
+                        stdout, deadline - time.perf_counter()):
+                    raise TimeoutError("exiftool did not answer in time.")
+                n = readinto(view[end:end + size])
+                if not n:
+                    raise IOError("exiftool process closed its output.")
+                reads += 1
+                if reads == 1 and record is not None:
+                    record["first_read"] = time.perf_counter()
+                floor = max(end - len(sentinel), 0)
+                end = stop = end + n
+                while stop > floor and buf[stop - 1] in _whitespace:
+                    stop -= 1
+                if buf.endswith(sentinel, 0, stop):
+                    break
+                if n == size and size < max_block_size:
+                    size *= 2
+            self._last_output_size = end
+            if record is not None:
+                record["reads"], record["bytes_read"] = reads, end
+            start, stop = 0, stop - len(sentinel)
+            if not raw:
+                while start < stop and buf[start] in _whitespace:
+                    start += 1
+            elif self._newline_pending:
+                start = _line_ending(buf, stop)
+            self._newline_pending = not buf.endswith(b"\n", 0, end)
+            return bytes(view[start:stop])
+        finally:
+            view.release()
+
+    def execute_json(self, *params, timeout=None):
         """Execute the given batch of parameters and parse the JSON output.
 
         This method is similar to :py:meth:`execute()`.  It
@@ -247,36 +807,153 @@ class ExifTool(object):
         pass in filenames according to the convention of the
         respective Python version – as raw strings in Python 2.x and
         as Unicode strings in Python 3.x.
+
+        For ``timeout`` see :py:meth:`execute()`.
+        """
+        return self._execute_json(params, timeout)
+
+    def _execute_json(self, params, timeout=None, lazy=False):
+        "Run a command with ``-j``, ``params`` is any iterable"
+        params = (b"-j",) + tuple(map(fsencode, params)) \
+            if isinstance(params, tuple) else \
+            itertools.chain((b"-j",), map(fsencode, params))
+        output, record = self._execute(params, timeout)
+        result = LazyRecords.from_output(output) if lazy else decoder(output)
+        record["parsed"] = time.perf_counter()
+        self.stats.commit(record)
+        return result
+
+    def execute_json_lazy(self, *params, timeout=None):
+        """Execute the given batch of parameters, decode JSON on access.
+
+        Like :py:meth:`execute_json()`, but returns a
+        :py:class:`LazyRecords` sequence, so the dictionary of a file
+        is only built if it is accessed.  This saves most of the
+        decoding time when only a few files of a large batch are used.
         """
-        params = map(fsencode, params)
-        return json.loads(self.execute(b"-j", *params).decode("utf-8"))
+        return self._execute_json(params, timeout, lazy=True)
 
-    def get_metadata_batch(self, filenames):
+    @staticmethod
+    def _profile_params(profile=None, fast=0):
+        """Parameters selecting the tags of ``profile`` and fast mode.
+
+        ``profile`` is a name in :py:data:`profiles` or a list of tags.
+        ``fast`` is 1 or 2 for ``-fast`` or ``-fast2``, which make
+        ``exiftool`` stop reading a file once the requested meta-data
+        is found (see the ``exiftool`` documentation for the details).
+        """
+        if isinstance(profile, basestring):
+            profile = profiles[profile]
+        params = ["-" + t for t in profile] if profile else []
+        if fast:
+            params.append("-fast" if fast == 1 else "-fast%d" % fast)
+        return params
+
+    @staticmethod
+    def _batch_params(options, filenames):
+        """Parameters of a batch command, without ``-j``.
+
+        A tuple if ``filenames`` has a length and the command is small
+        enough to be written at once, otherwise an iterator streaming
+        ``filenames``.
+        """
+        if isinstance(filenames, collectionsabc.Sized) and \
+                len(options) + len(filenames) < stream_params:
+            return tuple(options) + tuple(filenames)
+        return itertools.chain(options, filenames)
+
+    def get_metadata_batch(self, filenames, profile=None, fast=0,
+                           lazy=False):
         """Return all meta-data for the given files.
 
         The return value will have the format described in the
         documentation of :py:meth:`execute_json()`.
+
+        ``profile`` limits the extracted tags to a named profile from
+        :py:data:`profiles` or a list of tags, and ``fast`` enables
+        ``-fast`` (1) or ``-fast2`` (2) mode.  With ``lazy`` a
+        :py:class:`LazyRecords` sequence is returned instead of a list.
+
+        ``filenames`` can be any iterable, including a generator; large
+        batches are streamed to ``exiftool``, see
+        :py:data:`stream_params`.
         """
-        return self.execute_json(*filenames)
+        if isinstance(filenames, basestring):
+            raise TypeError("The argument 'filenames' must be "
+                            "an iterable of strings")
+        params = self._batch_params(self._profile_params(profile, fast),
+                                    filenames)
+        return self._execute_json(params, lazy=lazy)
+
+    def iter_metadata(self, filenames, chunk_size=256, progress=None,
+                      profile=None, fast=0):
+        """Yield all meta-data for the given files one file at a time.
+
+        ``filenames`` can be any iterable, including a generator.  The
+        files are passed to ``exiftool`` in chunks of ``chunk_size``,
+        and the dictionaries of a chunk are yielded as soon as the
+        chunk is finished, so memory use is bounded by the size of a
+        chunk rather than of the whole batch.  The dictionaries have
+        the format described in the documentation of
+        :py:meth:`execute_json()`.
+
+        If ``progress`` is given, it is called after every chunk as
+        ``progress(done, total)``, where ``total`` is ``None`` if
+        ``filenames`` has no length.  For ``profile`` and ``fast`` see
+        :py:meth:`get_metadata_batch()`.
+        """
+        if isinstance(filenames, basestring):
+            raise TypeError("The argument 'filenames' must be "
+                            "an iterable of strings")
+        try:
+            total = len(filenames)
+        except TypeError:
+            total = None
+        it, done = iter(filenames), 0
+        while True:
+            chunk = list(itertools.islice(it, chunk_size))
+            if not chunk:
+                break
+            data = self.get_metadata_batch(chunk, profile, fast)
+            done += len(chunk)
+            if progress is not None:
+                progress(done, total)
+            data.reverse()  # release each dict once it is consumed
+            while data:
+                yield data.pop()
 
-    def get_metadata(self, filename):
+    def get_metadata(self, filename, profile=None, fast=0):
         """Return meta-data for a single file.
 
         The returned dictionary has the format described in the
-        documentation of :py:meth:`execute_json()`.
+        documentation of :py:meth:`execute_json()`.  For ``profile``
+        and ``fast`` see :py:meth:`get_metadata_batch()`.
         """
-        return self.execute_json(filename)[0]
+        return self.get_metadata_batch([filename], profile, fast)[0]
+
+    def get_tag_bytes(self, tag, filename):
+        """Extract the raw value of a single tag from a single file.
 
-    def get_tags_batch(self, tags, filenames):
+        The value is extracted with ``-b``, so binary data such as
+        thumbnails is returned as a ``bytes`` object instead of a
+        placeholder.  The value is returned exactly as ``exiftool``
+        printed it.
+        """
+        return self.execute(b"-b", fsencode("-" + tag), fsencode(filename),
+                            raw=True)
+
+    def get_tags_batch(self, tags, filenames, lazy=False):
         """Return only specified tags for the given files.
 
         The first argument is an iterable of tags.  The tag names may
         include group names, as usual in the format <group>:<tag>.
 
-        The second argument is an iterable of file names.
+        The second argument is an iterable of file names, it is
+        streamed like in :py:meth:`get_metadata_batch()`.
 
         The format of the return value is the same as for
-        :py:meth:`execute_json()`.
+        :py:meth:`execute_json()`, or :py:meth:`execute_json_lazy()`
+        with ``lazy``.
         """
         # Explicitly ruling out strings here because passing in a
         # string would lead to strange and hard-to-find errors
@@ -286,9 +963,8 @@ class ExifTool(object):
         if isinstance(filenames, basestring):
             raise TypeError("The argument 'filenames' must be "
                             "an iterable of strings")
-        params = ["-" + t for t in tags]
-        params.extend(filenames)
-        return self.execute_json(*params)
+        params = self._batch_params(["-" + t for t in tags], filenames)
+        return self._execute_json(params, lazy=lazy)
 
     def get_tags(self, tags, filename):
         """Return only specified tags for a single file.
@@ -323,3 +999,435 @@ class ExifTool(object):
         ``None`` if this tag was not found in the file.
         """
         return self.get_tag_batch(tag, [filename])[0]
+
+
+class PipelinedExifTool(ExifTool):
+    """Run several commands on one ``exiftool`` process at a time.
+
+    :py:meth:`submit()` writes a command to ``exiftool`` immediately and
+    returns a :py:class:`concurrent.futures.Future` for its output, so
+    any number of commands from any number of threads can be in flight
+    on a single process.  Every command is terminated with a numbered
+    ``-executeNUM``; a reader thread matches the ``{readyNUM}`` echoed
+    by ``exiftool`` to the waiting future.
+
+    :py:meth:`execute()` submits a command and waits for the result,
+    so all other methods of :py:class:`ExifTool` work unchanged and
+    are safe to call from several threads.
+    """
+
+    def start(self):
+        """Start an ``exiftool`` process and the thread reading its output.
+
+        See :py:meth:`ExifTool.start()`.
+        """
+        if self.running:
+            warnings.warn("ExifTool already running; doing nothing.")
+            return
+        self._ids = itertools.count(1)
+        self._write_lock = threading.Lock()
+        super(PipelinedExifTool, self).start()
+
+    def _spawn(self):
+        super(PipelinedExifTool, self)._spawn()
+        self._futures = {}
+        self._eof = threading.Event()  # the reader has failed all futures
+        self._reader = threading.Thread(
+            target=self._read_responses,
+            args=(self._process, self._futures, self._eof),
+            name="PipelinedExifTool reader")
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _close(self, kill=False):
+        "Stop the process once the reader thread has finished"
+        if kill:
+            try:
+                self._process.kill()
+            except OSError:
+                pass
+        self._reader.join()
+        return super(PipelinedExifTool, self)._close(kill)
+
+    def _restart(self, process):
+        """Replace a dead or wedged ``process``.
+
+        Commands in flight on it fail with ``IOError``.  The process is
+        killed before the write lock is taken: a command being written
+        to a wedged process holds the lock until its write fails.
+        """
+        try:
+            process.kill()
+        except OSError:
+            pass
+        with self._write_lock:
+            if not self.running:
+                return ""
+            return super(PipelinedExifTool, self)._restart(process)
+
+    def terminate(self):
+        """Terminate the ``exiftool`` process of this instance.
+
+        Commands submitted before are finished first.  If the
+        subprocess isn't running, this method will do nothing.
+        """
+        if not self.running:
+            return
+        with self._write_lock:
+            self.running = False
+            try:
+                self._process.stdin.write(b"-stay_open\nFalse\n")
+                self._process.stdin.flush()
+            except OSError:
+                pass
+        self._close()
+        del self._process
+
+    def submit(self, *params, raw=False):
+        """Send the given batch of parameters to ``exiftool``.
+
+        Returns a :py:class:`concurrent.futures.Future` resolved with
+        the output of the command, see :py:meth:`ExifTool.execute()`.
+        """
+        record = {"queued": time.perf_counter()}
+        future = self._submit(params, record, raw)[0]
+
+        def commit(future):
+            if not future.cancelled() and future.exception() is None:
+                self.stats.commit(record)
+        future.add_done_callback(commit)
+        return future
+
+    def _submit(self, params, record, raw=False):
+        """Write a command, the reader thread completes timing `record`.
+
+        Returns the future and the process it was written to.
+        """
+        future, process = Future(), None
+        try:
+            with self._write_lock:
+                if not self.running:
+                    raise ValueError("ExifTool instance not running.")
+                process = self._process
+                record["started"] = time.perf_counter()
+                num = next(self._ids)
+                self._futures[num] = future, record, raw
+                if self._eof.is_set():  # too late for the reader to fail it
+                    self._futures.pop(num, None)
+                    raise IOError("exiftool process closed its output.")
+                record["bytes_written"] = self._write_command(
+                    process.stdin, params,
+                    b"-charset\nfilename=utf8\n-execute%d\n" % num)
+                record["written"] = time.perf_counter()
+        except Exception as e:
+            if process is not None and not isinstance(e, OSError):
+                self._restart(process)  # a partial command is in the pipe
+            raise
+        return future, process
+
+    def _execute(self, params, timeout=None, raw=False):
+        "Submit a command and wait for it, see `ExifTool._execute`"
+        record = {"queued": time.perf_counter()}
+        deadline = self._deadline(timeout)
+        process = self._process
+        if process.poll() is not None or self._eof.is_set():  # exited idle
+            self._restart(process)
+        try:
+            future, process = self._submit(params, record, raw)
+            output = future.result(
+                None if deadline is None else
+                max(deadline - time.perf_counter(), 0))
+        except FutureTimeout:
+            raise self._failed(process, TimeoutError(
+                "exiftool did not answer in time."))
+        except OSError as e:
+            raise self._failed(process, e)
+        return output, record
+
+    def _read_responses(self, process, futures, eof):
+        """Reader thread: resolve `futures` with the output of commands.
+
+        At the end of the output ``eof`` is set and the futures left
+        fail.
+        """
+        read = process.stdout.raw.read
+        prefix = sentinel[:-1]  # b"{ready"
+        buf, start, scan = bytearray(), 0, 0
+        after_sentinel = False  # output starts with the sentinel's line end
+        first_read, reads = None, 0  # of the output of the next command
+        while True:
+            chunk = read(max_block_size)
+            if not chunk:
+                break
+            if first_read is None:
+                first_read = time.perf_counter()
+            reads += 1
+            buf += chunk
+            while True:
+                pos = buf.find(prefix, scan)
+                if pos < 0:
+                    scan = max(start, len(buf) - len(prefix))
+                    break
+                close = buf.find(b"}", pos)
+                if close < 0:  # wait for the rest of the sentinel
+                    scan = pos
+                    break
+                num = buf[pos + len(prefix):close]
+                if not num.isdigit():  # not a sentinel
+                    scan = pos + 1
+                    continue
+                future, record, raw = futures.pop(int(num), (None,) * 3)
+                if future is not None:
+                    record.update(first_read=first_read, reads=reads,
+                                  bytes_read=close + 1 - start,
+                                  finished=time.perf_counter())
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(
+                            bytes(buf[_line_ending(buf, pos, start)
+                                      if after_sentinel else start:pos])
+                            if raw else bytes(buf[start:pos].strip()))
+                start = scan = close + 1
+                after_sentinel = True
+                # output of the next command may be in this chunk already
+                first_read, reads = (time.perf_counter(), 1) \
+                    if len(buf) - start > 2 else (None, 0)
+            del buf[:start]
+            scan -= start
+            start = 0
+        error = IOError("exiftool process closed its output.")
+        eof.set()
+        for future, _, _ in list(futures.values()):
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+        futures.clear()
+
+
+class ExifToolPool(object):
+    """Run several ``exiftool`` processes and spread batches across them.
+
+    The pool offers the batch methods of :py:class:`ExifTool`
+    (:py:meth:`get_metadata_batch()`, :py:meth:`get_tags_batch()` and
+    :py:meth:`get_tag_batch()`).  The file names of a batch are cut into
+    contiguous chunks of roughly equal total file size, the chunks are
+    handed out to ``size`` long-lived ``exiftool`` processes as they
+    become idle, and the results are returned in the order of the
+    input.  ``size`` defaults to the number of CPUs.
+
+    Like :py:class:`ExifTool`, the pool must be started before use and
+    can be used as a context manager::
+
+        with ExifToolPool(4) as pool:
+            metadata = pool.get_metadata_batch(files)
+
+    ``timeout`` is passed to the workers, see :py:class:`ExifTool`.
+    With ``hedge_after`` a chunk that isn't finished after that many
+    seconds is also sent to one of ``standby`` spare processes, and
+    whichever result arrives first is used.  The process still running
+    the other copy is killed and restarted.  This bounds the latency of
+    a batch when a single process gets stuck on a file.
+
+    .. py:attribute:: running
+
+       A Boolean value indicating whether the worker processes are
+       currently running.
+    """
+
+    # Number of chunks per worker; more chunks balance better when
+    # file size is a poor estimate of the time spent on a file.
+    chunks_per_worker = 4
+
+    def __init__(self, size=None, executable_=None, stats=None, timeout=None,
+                 hedge_after=None, standby=1):
+        self.size = size or os.cpu_count() or 1
+        self.executable = executable_
+        self.stats = Instrumentation() if stats is None else stats
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.standby = standby if hedge_after is not None else 0
+        self.running = False
+
+    def start(self):
+        """Start the worker processes.
+
+        This method will issue a ``UserWarning`` if the pool is already
+        running.
+        """
+        if self.running:
+            warnings.warn("ExifToolPool already running; doing nothing.")
+            return
+        self._workers = []
+        try:
+            for _ in range(self.size + self.standby):
+                worker = ExifTool(self.executable, self.stats, self.timeout)
+                worker.start()
+                self._workers.append(worker)
+        except Exception:
+            for worker in self._workers:
+                worker.terminate()
+            raise
+        self._idle = self._workers[:self.size]
+        self._spare = self._workers[self.size:]
+        self._idle_cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(self.size)
+        if self.hedge_after is not None:  # runs both copies of a chunk
+            self._hedge_executor = ThreadPoolExecutor(2 * self.size)
+        self.running = True
+
+    def terminate(self):
+        """Wait for pending batches and terminate all worker processes.
+
+        If the pool isn't running, this method will do nothing.
+        """
+        if not self.running:
+            return
+        self._executor.shutdown()
+        if self.hedge_after is not None:
+            self._hedge_executor.shutdown()
+            del self._hedge_executor
+        for worker in self._workers:
+            worker.terminate()
+        del self._workers, self._idle, self._spare, self._executor
+        self.running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+
+    def __del__(self):
+        self.terminate()
+
+    def _chunks(self, filenames):
+        "Cut `filenames` into contiguous chunks of similar total size"
+        sizes = []
+        for filename in filenames:
+            try:
+                sizes.append(os.path.getsize(filename) + file_overhead)
+            except (OSError, TypeError, ValueError):
+                sizes.append(file_overhead)
+        target = sum(sizes) / (self.size * self.chunks_per_worker)
+        chunks, start, acc = [], 0, 0
+        for i, size in enumerate(sizes):
+            acc += size
+            if acc >= target:
+                chunks.append(filenames[start:i + 1])
+                start, acc = i + 1, 0
+        if start < len(filenames):
+            chunks.append(filenames[start:])
+        return chunks
+
+    def _call(self, idle, method, chunk, args, kwargs, claim=None):
+        """Call `method` on a worker from the `idle` list.
+
+        ``claim["worker"]`` is the worker while it runs the call, and
+        setting ``claim["cancelled"]`` stops waiting for one, see
+        :py:meth:`_cancel()`.
+        """
+        queued = time.perf_counter()
+        with self._idle_cond:
+            while not idle and not (claim and claim["cancelled"]):
+                self._idle_cond.wait()
+            if claim and claim["cancelled"]:
+                raise CancelledError()
+            worker = idle.pop()
+            if claim is not None:
+                claim["worker"] = worker
+        worker._queued = queued  # pylint: disable=protected-access
+        try:
+            return getattr(worker, method)(*args + (chunk,), **kwargs)
+        finally:
+            with self._idle_cond:
+                if claim is not None:
+                    claim["worker"] = None
+                idle.append(worker)
+                self._idle_cond.notify_all()
+
+    def _cancel(self, future, claim):
+        """Stop the call of `future`, which lost a hedge.
+
+        The process of a busy worker is killed, so the call fails at
+        once and the worker restarts it, instead of holding the worker
+        and a thread until the command is finished.
+        """
+        future.cancel()
+        with self._idle_cond:
+            claim["cancelled"] = True
+            self._idle_cond.notify_all()
+            worker = claim["worker"]
+            if worker is not None:
+                process = worker._process  # pylint: disable=protected-access
+                process.kill()
+                process.wait()  # seen as exited if the call just finished
+
+    def _run(self, method, chunk, args, kwargs):
+        "Call `method` on an idle worker, hedge with a spare one if slow"
+        if self.hedge_after is None:
+            return self._call(self._idle, method, chunk, args, kwargs)
+        call = self._hedge_executor.submit
+        claims = {"worker": None, "cancelled": False}, \
+            {"worker": None, "cancelled": False}
+        first = call(self._call, self._idle, method, chunk, args, kwargs,
+                     claims[0])
+        try:
+            return first.result(self.hedge_after)
+        except FutureTimeout:
+            pass
+        self.stats.count("hedges")
+        second = call(self._call, self._spare, method, chunk, args, kwargs,
+                      claims[1])
+        calls = {first: claims[0], second: claims[1]}
+        pending = set(calls)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        self._cancel(loser, calls[loser])
+                    return future.result()
+            if not pending:  # both failed
+                return future.result()
+
+    def _map(self, method, filenames, *args, **kwargs):
+        "Run `method` over chunks of `filenames` and join the results"
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+        if isinstance(filenames, basestring):
+            raise TypeError("The argument 'filenames' must be "
+                            "an iterable of strings")
+        futures = [self._executor.submit(self._run, method, chunk, args,
+                                         kwargs)
+                   for chunk in self._chunks(list(filenames))]
+        if kwargs.get("lazy"):
+            return LazyRecords.join(future.result() for future in futures)
+        result = []
+        for future in futures:
+            result.extend(future.result())
+        return result
+
+    def get_metadata_batch(self, filenames, profile=None, fast=0,
+                           lazy=False):
+        """Return all meta-data for the given files.
+
+        See :py:meth:`ExifTool.get_metadata_batch()`.
+        """
+        return self._map("get_metadata_batch", filenames,
+                         profile=profile, fast=fast, lazy=lazy)
+
+    def get_tags_batch(self, tags, filenames, lazy=False):
+        """Return only specified tags for the given files.
+
+        See :py:meth:`ExifTool.get_tags_batch()`.
+        """
+        if isinstance(tags, basestring):
+            raise TypeError("The argument 'tags' must be "
+                            "an iterable of strings")
+        return self._map("get_tags_batch", filenames, list(tags), lazy=lazy)
+
+    def get_tag_batch(self, tag, filenames):
+        """Extract a single tag from the given files.
+
+        See :py:meth:`ExifTool.get_tag_batch()`.
+        """
+        return self._map("get_tag_batch", filenames, tag)
@@ -1,44 +1,129 @@
+import os
+import threading
+from pathlib import Path
 import exiftool
+import metacache
+import metaloader
+import metadiff
+import blobs
+import tagcopy
 from qtapp import QtForm, QtWidgets, QtCore, Qt, QtGui, signal, options
 
 # TODO:
 # Скрытие тегов + отобразить скрытые
 # --фильтрация, сохранение фильтров?
-# Синхронизация выделения тегов
-# Копирование выбранных тегов между файлами
+
+CACHE_DB = Path.home() / ".exifdiff" / "metadata.sqlite"
+PREFETCH_WINDOW = 4  # files to prefetch above and below the selected one
+LIGHT_PROFILE = "capture"  # tags loaded on selection, see exiftool.profiles
+COMMAND_TIMEOUT = 30  # seconds before a stuck exiftool is restarted
+WATCH_DELAY = 300  # ms without file change events before reloading
+# Opt-in file with exiftool statistics in Prometheus text format
+METRICS_PATH = os.environ.get("EXIFDIFF_METRICS")
+
+# Tag status of a panel row compared to the other panel
+SAME, CHANGED, MISSING, ABSENT = range(4)  # MISSING: in the other file
+COLORS = {CHANGED: (None, "#efe4b0"),  # key, value column; pale yellow
+          MISSING: ("#ffd0d0", "#ffd0d0"),
+          ABSENT: ("#f0f0f0", "#f0f0f0")}
+DISPLAY_MAX = 256  # characters of a value shown in a cell
+TOOLTIP_MAX = 4096  # characters of a value shown in a tooltip
+
+
+def shorten(value, limit):
+    "Text of `value` cut to `limit` characters"
+    text = str(value)
+    return text if len(text) <= limit else text[:limit] + "\u2026"
+
 
 class DictModel(QtCore.QAbstractTableModel):
-    "Model to display Python dict in a Qt widget"
-    def __init__(self, d=None):
+    "Model to display one side of `metadiff.Comparison` in a Qt widget"
+    _brushes = {}  # status -> (key column brush, value column brush)
+
+    def __init__(self, comparison, side):
         super().__init__()
-        self.keys = tuple(d.keys())
-        self.source = d
-        self.other = {}
+        self.comparison, self.side = comparison, side
+        own, other = ((metadiff.LEFT_ONLY, metadiff.RIGHT_ONLY) if side == 0
+                      else (metadiff.RIGHT_ONLY, metadiff.LEFT_ONLY))
+        self.status_map = {metadiff.SAME: SAME, metadiff.CHANGED: CHANGED,
+                           own: MISSING, other: ABSENT}
+        # Display strings and diff status are computed once, not per paint
+        self.texts, self.status, self.meta = ([], []), [], None
+        self._rebuild()
+
+    @property
+    def source(self):
+        "Metadata displayed"
+        return self.comparison.metas[self.side]
+
+    def _value_texts(self):
+        return ["" if v is None else shorten(v, DISPLAY_MAX)
+                for v in self.comparison.values[self.side]]
+
+    def _rebuild(self):
+        self.meta = self.source
+        self.texts = [str(k) for k in self.comparison.keys], \
+            self._value_texts()
+        self.status = [self.status_map[i] for i in self.comparison.status]
+
+    def refresh(self, reset):
+        """
+        Update after the comparison has changed. `reset` means rows were
+        added or removed, otherwise only changed rows are repainted
+        """
+        if reset:
+            self.beginResetModel()
+            self._rebuild()
+            self.endResetModel()
+            return
+        old_texts, old_status = self.texts[1], self.status
+        if self.meta is not self.source:  # this side has changed
+            self.meta = self.source
+            self.texts = self.texts[0], self._value_texts()
+        self.status = [self.status_map[i] for i in self.comparison.status]
+        first = None
+        for row in range(len(old_status) + 1):
+            changed = row < len(old_status) and (
+                self.status[row] != old_status[row] or
+                self.texts[1][row] != old_texts[row])
+            if changed and first is None:
+                first = row
+            elif not changed and first is not None:
+                self.dataChanged.emit(self.index(first, 0),
+                                      self.index(row - 1, 1),
+                                      [Qt.DisplayRole, Qt.BackgroundRole])
+                first = None
 
     def rowCount(self, parent):  # pylint: disable=invalid-name
-        "Dict length"
-        return len(self.keys)
+        "Number of tags in both files"
+        return len(self.status)
 
     @staticmethod
     def columnCount(parent):  # pylint: disable=invalid-name
         "key, value - 2 columns"
         return 2
 
+    @classmethod
+    def brush(cls, status, col):
+        "Cached background brush"
+        brushes = cls._brushes.get(status)
+        if brushes is None:
+            brushes = cls._brushes[status] = tuple(
+                QtGui.QBrush(QtGui.QColor(c)) if c else None
+                for c in COLORS.get(status, (None, None)))
+        return brushes[col]
+
     def data(self, index, role):
         "Return data to display"
         row, col = index.row(), index.column()
-        k = self.keys[row]
-        if role in (Qt.DisplayRole, Qt.ToolTipRole):
-            return str(self.source[k] if col else k)
+        if role == Qt.DisplayRole:
+            return self.texts[col][row]
+        elif role == Qt.ToolTipRole:
+            value = self.comparison.values[self.side][row]
+            return self.texts[0][row] if not col else \
+                None if value is None else shorten(value, TOOLTIP_MAX)
         elif role == Qt.BackgroundRole:
-            v_this = self.source[k]
-            v_other = self.other.get(k)
-            color = None
-            if v_other is None:
-                color = "#ffd0d0"
-            elif v_this != v_other and col == 1:
-                color = "#efe4b0"  # pale yellow
-            return QtGui.QBrush(QtGui.QColor(color)) if color else None
+            return self.brush(self.status[row], col)
 
     @staticmethod
     def headerData(section, orientation, role):  # pylint: disable=invalid-name
@@ -48,8 +133,136 @@ class DictModel(QtCore.QAbstractTableModel):
         captions = "Key", "Value"
         return captions[section]
 
-    def compare(self, other):
-        self.other = other
+
+class MatrixModel(QtCore.QAbstractTableModel):
+    "Model to display `diffmatrix.DiffMatrix`: rows are tags, columns files"
+    def __init__(self, matrix):
+        super().__init__()
+        self.matrix = matrix
+        self.rows = list(range(len(matrix.tags)))  # displayed tag indices
+        self.columns = list(range(len(matrix.files)))  # file order
+        self.texts = [[shorten(v, DISPLAY_MAX) for v in values]
+                      for values in matrix.values]
+        self.reference = 0
+        self.deviation, self.deviation_count = matrix.deviations(0) \
+            if matrix.files else (None, None)
+
+    def rowCount(self, parent):  # pylint: disable=invalid-name
+        "Number of displayed tags"
+        return len(self.rows)
+
+    def columnCount(self, parent):  # pylint: disable=invalid-name
+        "Number of files"
+        return len(self.columns)
+
+    def data(self, index, role):
+        "Return data to display"
+        t, f = self.rows[index.row()], self.columns[index.column()]
+        code = self.matrix.codes[t, f]
+        if role == Qt.DisplayRole:
+            return "" if code < 0 else self.texts[t][code]
+        elif role == Qt.ToolTipRole:
+            return None if code < 0 else \
+                shorten(self.matrix.values[t][code], TOOLTIP_MAX)
+        elif role == Qt.BackgroundRole:
+            status = MISSING if code < 0 else \
+                CHANGED if self.deviation[t, f] else SAME
+            return DictModel.brush(status, 1)
+
+    def headerData(self, section, orientation, role):  # pylint: disable=invalid-name
+        "Tag names and file names with count of tags differing from reference"
+        if role != Qt.DisplayRole:
+            return
+        if orientation == Qt.Vertical:
+            return self.matrix.tags[self.rows[section]]
+        f = self.columns[section]
+        name = os.path.basename(self.matrix.files[f])
+        if f == self.reference:
+            return "[%s]" % name
+        return "%s (%d)" % (name, self.deviation_count[f])
+
+    def set_varying_only(self, varying_only):
+        "Show only tags which differ among files"
+        self.beginResetModel()
+        self.rows = self.matrix.varying().nonzero()[0].tolist() \
+            if varying_only else list(range(len(self.matrix.tags)))
+        self.endResetModel()
+
+    def set_reference(self, column):
+        "Highlight values which differ from file in `column`"
+        self.reference = self.columns[column]
+        self.deviation, self.deviation_count = \
+            self.matrix.deviations(self.reference)
+        self.headerDataChanged.emit(Qt.Horizontal, 0, len(self.columns) - 1)
+        self.dataChanged.emit(self.index(0, 0), self.index(
+            len(self.rows) - 1, len(self.columns) - 1), [Qt.BackgroundRole])
+
+    def group_by(self, tags):
+        "Order files so that files with the same values of `tags` are adjacent"
+        groups, _ = self.matrix.groups(tags)
+        self.beginResetModel()
+        self.columns = groups.argsort(kind="stable").tolist()
+        self.endResetModel()
+
+
+class FormMatrix(QtWidgets.QWidget):
+    "Tag x file matrix of all files in a folder"
+    _layout_ = QtWidgets.QVBoxLayout
+    matrix_loaded = QtCore.Signal(object)
+    load_failed = QtCore.Signal(str)
+    load_progress = QtCore.Signal(int, int)
+
+    def __init__(self, folder, source):  # pylint: disable=super-init-not-called
+        import diffmatrix  # requires NumPy
+        self.setWindowTitle(folder)
+        self.chkVarying = QtWidgets.QCheckBox("Varying tags only", self)
+        self.chkVarying.setChecked(True)
+        self.chkVarying.setEnabled(False)
+        self.btnGroup = QtWidgets.QPushButton("Group by selected tags", self)
+        self.btnGroup.setEnabled(False)
+        self.btnGroup.clicked.connect(self.group_selected)
+        self.lblStatus = QtWidgets.QLabel(self)
+        self.tableMatrix = QtWidgets.QTableView(self)
+        for i in (self.chkVarying, self.btnGroup, self.lblStatus,
+                  self.tableMatrix):
+            self.layout().addWidget(i)
+        self.matrix_loaded.connect(self.show_matrix)
+        self.load_failed.connect(
+            lambda message: self.lblStatus.setText("Failed: " + message))
+        self.load_progress.connect(
+            lambda done, total: self.lblStatus.setText(
+                "Loading %d / %d" % (done, total)))
+        files = sorted(i.path for i in os.scandir(folder) if i.is_file())
+        threading.Thread(daemon=True, target=self.load, args=(
+            diffmatrix.DiffMatrix, source, files)).start()
+
+    def load(self, matrix_class, source, files):
+        "Worker thread: load the matrix, report the result by a signal"
+        try:
+            matrix = matrix_class.load(source, files, self.load_progress.emit)
+        except Exception as e:  # pylint: disable=broad-except
+            self.load_failed.emit(str(e) or type(e).__name__)
+            return
+        self.matrix_loaded.emit(matrix)
+
+    def show_matrix(self, matrix):
+        "SLOT: matrix is loaded"
+        model = MatrixModel(matrix)
+        self.tableMatrix.setModel(model)
+        self.tableMatrix.horizontalHeader().sectionClicked.connect(
+            model.set_reference)
+        self.chkVarying.toggled.connect(model.set_varying_only)
+        model.set_varying_only(self.chkVarying.isChecked())
+        self.chkVarying.setEnabled(True)
+        self.btnGroup.setEnabled(True)
+        self.lblStatus.setText("%d files, %d tags, %d vary" % (
+            len(matrix.files), len(matrix.tags), matrix.varying().sum()))
+
+    def group_selected(self):
+        "SLOT: group files by values of the selected tags"
+        model = self.tableMatrix.model()
+        rows = {i.row() for i in self.tableMatrix.selectedIndexes()}
+        model.group_by([model.matrix.tags[model.rows[i]] for i in rows])
 
 
 class FormMain(QtWidgets.QWidget):
@@ -69,9 +282,29 @@ class FormMain(QtWidgets.QWidget):
 
 class Form1(QtWidgets.QWidget):
     model_changed = QtCore.Signal()
+    value_fetched = QtCore.Signal(object, object)  # BlobHandle, bytes
+    fetch_failed = QtCore.Signal(object, str)  # BlobHandle, error message
+    tags_copied = QtCore.Signal(str, object)  # path, tagcopy counts
+    copy_failed = QtCore.Signal(str, str)  # path, error message
 
     def __init__(self, secondary=None):  # pylint: disable=super-init-not-called
         self.control = None
+        self.side = None
+        self.current_path = self.meta_path = None
+        self.meta_ident = None  # metacache.file_identity when loaded
+        self.profile = LIGHT_PROFILE  # requested for the current file
+        self.meta = {}
+        self.treeTags.setUniformRowHeights(True)
+        self.treeTags.doubleClicked.connect(self.export_value)
+        self.value_fetched.connect(self.save_value)
+        self.fetch_failed.connect(
+            lambda handle, message: QtWidgets.QMessageBox.warning(
+                self, "Export " + handle.tag, message))
+        self.tags_copied.connect(self.copied)
+        self.copy_failed.connect(
+            lambda path, message: QtWidgets.QMessageBox.warning(
+                self, "Copy tags", "Copying to %s failed: %s" % (path,
+                                                                 message)))
         p1 = r"C:\Users\Андрей\Pictures\_trash"
         model = QtWidgets.QFileSystemModel()
         model.setFilter(QtCore.QDir.Files)
@@ -84,49 +317,320 @@ class Form1(QtWidgets.QWidget):
             secondary.pnlControl.setVisible(False)
 
     def selected(self, current, previous):
-        fpath = current.model().filePath(current)
-        meta = self.control.exiftool.get_metadata(fpath.encode())
-        self.treeTags.setModel(DictModel(meta))
-        self.treeTags.resizeColumnToContents(0)
+        self.current_path = current.model().filePath(current)
+        self.control.load(self, LIGHT_PROFILE)
+        self.control.loader.prefetch(self, self.neighbours(current),
+                                     LIGHT_PROFILE)
+
+    def btnAllTags_clicked(self):
+        "Load all tags of the selected files of both panels"
+        if self.current_path:
+            self.control.load(self, None)
+
+    def reload(self):
+        "Load metadata of the current file again, replacing the shown one"
+        if self.current_path:
+            self.control.loader.request(*self.reload_request())
+
+    def reload_request(self):
+        "Loader request for the current file, shown tags will be replaced"
+        self.meta_path = None  # do not merge with outdated tags
+        return self, self.current_path, self.profile
+
+    @staticmethod
+    def neighbours(index, window=PREFETCH_WINDOW):
+        "File paths of rows around `index`, nearest first"
+        model, parent, row = index.model(), index.parent(), index.row()
+        count, paths = model.rowCount(parent), []
+        for i in range(1, window + 1):
+            for r in (row + i, row - i):
+                if 0 <= r < count:
+                    paths.append(model.filePath(model.index(r, 0, parent)))
+        return paths
+
+    def meta_loaded(self, path, meta):
+        "Show metadata of the selected file"
+        if path != self.current_path:
+            return
+        if path == self.meta_path:  # more tags of the shown file
+            merged = dict(self.meta)
+            merged.update(meta)
+            meta = merged
+        self.meta, self.meta_path = meta, path
+        self.meta_ident = metacache.file_identity(path)
+        self.model_changed.emit()
+
+    def meta_failed(self, path, message):
+        "Metadata of the selected file could not be loaded"
+        if path != self.current_path:
+            return
+        # Shown in the tags view the way exiftool reports file errors
+        self.meta = {"SourceFile": path, "ExifTool:Error": message}
+        self.meta_path, self.meta_ident = None, None
         self.model_changed.emit()
 
+    def export_value(self, index):
+        "SLOT: fetch binary or oversized value of a tag to save it to a file"
+        model = self.treeTags.model()
+        value = model.comparison.values[self.side][index.row()]
+        if not isinstance(value, blobs.BlobHandle):
+            return
+        threading.Thread(daemon=True, target=self.fetch_value, args=(
+            self.control.blobs, value)).start()
+
+    def fetch_value(self, source, handle):
+        "Worker thread: fetch the value of `handle`, report it by a signal"
+        try:
+            data = source.fetch(handle)
+        except Exception as e:  # pylint: disable=broad-except
+            self.fetch_failed.emit(handle, str(e) or type(e).__name__)
+            return
+        self.value_fetched.emit(handle, data)
+
+    def save_value(self, handle, data):
+        "SLOT: value of `handle` is fetched, ask where to save it"
+        name = handle.tag.rpartition(":")[2] + (".bin" if handle.binary
+                                                else ".txt")
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export " + handle.tag,
+            os.path.join(os.path.dirname(handle.path), name))
+        if path:
+            with open(path, "wb") as f:
+                f.write(data)
+
+    def copied(self, path, counts):
+        "SLOT: tags are copied to `path`, show what was written"
+        self.reload()
+        if counts.get("weren't updated"):
+            QtWidgets.QMessageBox.warning(
+                self, "Copy tags", "exiftool could not write %s." % path)
+
     def btnChooseFolder_clicked(self):
         p = QtWidgets.QFileDialog.getExistingDirectory(
             self, "Choose folder", self.treeFiles.model().rootPath())
         if p:
+            self.control.loader.cancel_prefetch(self)
             self.treeFiles.setRootIndex(self.treeFiles.model().setRootPath(p))
+            self.control.watch_files()
 
-    def set_controller(self, widget):
-        self.control = widget
+    def set_controller(self, widget, side):
+        "Show `side` of the comparison of `widget`"
+        self.control, self.side = widget, side
+        self.treeTags.setModel(DictModel(widget.comparison, side))
 
     def get_current_meta(self):
-        model = self.treeTags.model()
-        return model.source if model else {}
+        return self.meta
 
-    def update_comparison(self, other):
-        model = self.treeTags.model()
-        if model:
-            model.compare(other)
+    def folder(self):
+        "Folder shown in the file list"
+        return self.treeFiles.model().rootPath()
+
+    def file_changed(self):
+        "Shown file was modified, replaced or removed since it was loaded"
+        return bool(self.meta_path) and \
+            metacache.file_identity(self.meta_path) != self.meta_ident
+
+    def update_comparison(self, reset):
+        "Comparison has changed, see `DictModel.refresh`"
+        self.treeTags.model().refresh(reset)
+        if reset:
+            self.treeTags.resizeColumnToContents(0)
 
 class PnlControl():
     def __init__(self, panel1, panel2):
         self.panel1 = panel1
         self.panel2 = panel2
-        panel1.set_controller(self)
-        panel2.set_controller(self)
-        panel1.model_changed.connect(self.model_changed)
-        panel2.model_changed.connect(self.model_changed)
+        self.comparison = metadiff.Comparison()
+        panel1.set_controller(self, 0)
+        panel2.set_controller(self, 1)
+        panel1.model_changed.connect(lambda: self.model_changed(panel1))
+        panel2.model_changed.connect(lambda: self.model_changed(panel2))
+        self._syncing = False
+        self.matrix_forms = []
+        self.sync_views(panel1, panel2)
+        self.sync_views(panel2, panel1)
 
-        self.exiftool = exiftool.ExifTool()
+        self.exiftool = exiftool.PipelinedExifTool(timeout=COMMAND_TIMEOUT)
+        self.exiftool.stats.export_path = METRICS_PATH
         self.exiftool.start()
+        CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+        self.metadata = metacache.MetadataCache(
+            self.exiftool, db_path=str(CACHE_DB), compact=True,
+            max_value_size=blobs.MAX_VALUE_SIZE)
+        self.blobs = metacache.BlobCache(self.exiftool)
+        self.loader = metaloader.MetadataLoader(self.metadata)
+        self.loader.loaded.connect(self.meta_loaded)
+        self.loader.failed.connect(self.meta_failed)
+        self.latency_timer = QtCore.QTimer(self)
+        self.latency_timer.timeout.connect(self.show_latency)
+        self.latency_timer.start(1000)
+        # Shown files and folders are watched, bursts of events are merged
+        self._changed = set()
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.path_changed)
+        self.watcher.directoryChanged.connect(self.path_changed)
+        self.watch_timer = QtCore.QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(WATCH_DELAY)
+        self.watch_timer.timeout.connect(self.files_changed)
+        self.watch_files()
     
     def stop(self):
+        self.watch_timer.stop()
+        self.latency_timer.stop()
+        self.loader.stop()
+        self.metadata.close()
         self.exiftool.terminate()
     
-    def model_changed(self):
-        self.panel1.update_comparison(self.panel2.get_current_meta())
-        self.panel2.update_comparison(self.panel1.get_current_meta())
+    @staticmethod
+    def meta_loaded(panel, path, meta):
+        "SLOT: metadata loaded in background"
+        panel.meta_loaded(path, meta)
+
+    @staticmethod
+    def meta_failed(panel, path, message):
+        "SLOT: metadata loading failed"
+        panel.meta_failed(path, message)
+
+    def load(self, panel, profile):
+        """
+        Load tags of `profile` of the current file of `panel`. The other
+        panel is reloaded with `profile` if it has another one, so tags
+        requested on one side only aren't shown as differences
+        """
+        requests = [(panel, panel.current_path, profile)]
+        panel.profile = profile
+        other = self.panel2 if panel is self.panel1 else self.panel1
+        if other.profile != profile:
+            other.profile = profile
+            if other.current_path:
+                requests.append(other.reload_request())
+        self.loader.request_batch(requests)
+
+    def show_latency(self):
+        "SLOT: show rolling exiftool latency"
+        latency = self.exiftool.stats.rolling()
+        if latency:
+            self.lblLatency.setText("%.0f/%.0f ms" % (
+                latency["p50"] * 1000, latency["p95"] * 1000))
+
+    def watch_files(self):
+        "Watch files and folders shown in the panels, forget others"
+        panels = self.panel1, self.panel2
+        files = {p.meta_path for p in panels if p.meta_path}
+        folders = {p.folder() for p in panels if p.folder()}
+        watched = set(self.watcher.files()), set(self.watcher.directories())
+        for paths, current in ((files, watched[0]), (folders, watched[1])):
+            if current - paths:
+                self.watcher.removePaths(list(current - paths))
+            added = [i for i in paths - current if os.path.exists(i)]
+            if added:
+                self.watcher.addPaths(added)
+
+    def path_changed(self, path):
+        "SLOT: watched file or folder changed, wait for the burst to end"
+        self._changed.add(path)
+        self.watch_timer.start()
+
+    def files_changed(self):
+        """
+        SLOT: reload panels whose file changed, in one batch.
+        Files replaced by a rename are noticed through their folder
+        """
+        changed, self._changed = self._changed, set()
+        panels = [p for p in (self.panel1, self.panel2)
+                  if p.meta_path and (p.meta_path in changed or
+                                      os.path.dirname(p.meta_path) in changed)
+                  and p.file_changed()]
+        self.metadata.invalidate({p.meta_path for p in panels})
+        self.loader.request_batch([p.reload_request() for p in panels])
+        self.watch_files()  # a replaced file is no longer watched
+
+    def btnCopyRight_clicked(self):
+        self.copy_selected(self.panel1, self.panel2)
+
+    def btnCopyLeft_clicked(self):
+        self.copy_selected(self.panel2, self.panel1)
+
+    def copy_selected(self, src, dst):
+        "Copy tags selected in panel `src` to the file of panel `dst`"
+        if not (src.meta_path and dst.meta_path):
+            return
+        rows = sorted({i.row() for i in src.treeTags.selectedIndexes()})
+        tags = [k for k in tagcopy.writable_tags(
+            [self.comparison.keys[i] for i in rows]) if k in src.meta]
+        changes = tagcopy.plan(src.meta, [dst.meta], tags)  # dry run
+        if not changes:
+            return
+        text = "\n".join("%s: %s \u2192 %s" % (
+            tag, "" if old is None else shorten(old, 80), shorten(new, 80))
+                         for tag, old, new in changes[0][1])
+        answer = QtWidgets.QMessageBox.question(
+            self, "Copy tags", "Copy to %s?\n\n%s\n\nThe original file is "
+            "kept as %s_original." % (dst.meta_path, text,
+                                      os.path.basename(dst.meta_path)))
+        if answer != QtWidgets.QMessageBox.Yes:
+            return
+        threading.Thread(daemon=True, target=self.copy_tags, args=(
+            src.meta_path, dst, dst.meta_path,
+            [tag for tag, _, _ in changes[0][1]], dst.profile)).start()
+
+    def copy_tags(self, source, dst, path, tags, profile):
+        "Worker thread: copy `tags` to `path` shown in `dst`, report by signal"
+        try:
+            counts = tagcopy.copy_tags(self.exiftool, source, [path], tags,
+                                       cache=self.metadata, profile=profile)
+        except Exception as e:  # pylint: disable=broad-except
+            dst.copy_failed.emit(path, str(e) or type(e).__name__)
+            return
+        dst.tags_copied.emit(path, counts)
+
+    def btnMatrix_clicked(self):
+        "Open tag x file matrix of the folder of the left panel"
+        folder = self.panel1.treeFiles.model().rootPath()
+        form = QtForm(FormMatrix, folder=folder, source=self.metadata)
+        form.show()
+        self.matrix_forms.append(form)
+
+    def model_changed(self, panel):
+        "Metadata of `panel` has changed, only its side is recomputed"
+        reset = self.comparison.set_side(panel.side, panel.get_current_meta())
+        self.panel1.update_comparison(reset)
+        self.panel2.update_comparison(reset)
+        self.watch_files()
+
+    def sync_views(self, src, dst):
+        "Scroll and select tags of `dst` along with `src`, rows are aligned"
+        src.treeTags.verticalScrollBar().valueChanged.connect(
+            dst.treeTags.verticalScrollBar().setValue)
+        src.treeTags.selectionModel().selectionChanged.connect(
+            lambda *_: self.sync_selection(src, dst))
+        src.treeTags.selectionModel().currentChanged.connect(
+            lambda *_: self.sync_selection(src, dst))
+
+    def sync_selection(self, src, dst):
+        "Copy selected rows and current row of `src` to `dst`"
+        if self._syncing:
+            return
+        self._syncing = True
+        try:
+            model = dst.treeTags.model()
+            selection = QtCore.QItemSelection()
+            for rng in src.treeTags.selectionModel().selection():
+                selection.select(model.index(rng.top(), 0),
+                                 model.index(rng.bottom(), 1))
+            sel_model = dst.treeTags.selectionModel()
+            current = src.treeTags.currentIndex()
+            if current.isValid():
+                sel_model.setCurrentIndex(
+                    model.index(current.row(), current.column()),
+                    QtCore.QItemSelectionModel.NoUpdate)
+            sel_model.select(selection,
+                             QtCore.QItemSelectionModel.ClearAndSelect)
+        finally:
+            self._syncing = False
 
 
-options['debug'] = True
-QtForm(FormMain)
+if __name__ == '__main__':
+    options['debug'] = True
+    QtForm(FormMain)
@@ -0,0 +1,252 @@
+"""
+Metadata cache in front of ExifTool
+
+Entries are keyed on file identity (path, size, mtime_ns, inode), so a
+file that was rewritten since it was cached is extracted again.  Recent
+entries are kept in memory within a byte budget; an optional SQLite
+database keeps them across restarts.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import blobs
+import metadiff
+import records
+
+
+class LRU():
+    "Least recently used mapping limited by total size of values in bytes"
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()  # key -> (value, size)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        "Return value for `key` and mark it as recently used"
+        item = self._items.get(key)
+        if item is None:
+            return default
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size):
+        "Store `value` of `size` bytes, evicting least recently used items"
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self._items[key] = value, size
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self.nbytes -= evicted
+
+    def pop(self, key, default=None):
+        "Remove `key` and return its value"
+        item = self._items.pop(key, None)
+        if item is None:
+            return default
+        self.nbytes -= item[1]
+        return item[0]
+
+    def clear(self):
+        "Remove all items"
+        self._items.clear()
+        self.nbytes = 0
+
+
+SCHEMA_VERSION = 2  # of the SQLite store, older stores are recreated
+
+
+def variant_key(profile=None, fast=0):
+    "Cache key part for a tag profile (name or list of tags) and fast mode"
+    if profile is None:
+        profile = "all"
+    elif not isinstance(profile, str):
+        profile = ",".join(sorted(profile))
+    return profile + ("/fast%d" % fast if fast else "")
+
+
+def file_identity(filename):
+    """
+    Return (path, size, mtime_ns, inode) of a file,
+    `None` if it cannot be accessed
+    """
+    path = os.path.abspath(os.fsdecode(filename))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return path, st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class MetadataCache():
+    """
+    Cache for `get_metadata` and `get_metadata_batch` of an ExifTool
+    (or ExifToolPool) instance. Only files missing from the cache are
+    passed to exiftool, in one batch. `hits` and `misses` count files.
+    With `compact` metadata is kept and returned as `records.Record`.
+    With `max_value_size` binary and longer text values are replaced by
+    `blobs.BlobHandle`. Metadata of different tag profiles is cached
+    separately.
+    """
+    def __init__(self, exiftool_, max_bytes=64 << 20, db_path=None,
+                 compact=False, max_value_size=None):
+        self.exiftool = exiftool_
+        self.max_value_size = max_value_size
+        self.schemas = records.SchemaTable() if compact else None
+        self.memory = LRU(max_bytes)  # (path, variant) -> (identity, metadata)
+        self.variants = set()
+        self.hits = self.misses = 0
+        self._lock = threading.RLock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._db.execute("DROP TABLE IF EXISTS metadata")
+                self._db.execute("PRAGMA user_version=%d" % SCHEMA_VERSION)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata (path TEXT, variant TEXT, "
+                "size INTEGER, mtime_ns INTEGER, inode INTEGER, data TEXT, "
+                "PRIMARY KEY (path, variant))")
+            self._db.commit()
+
+    def close(self):
+        "Close the on-disk store"
+        with self._lock:
+            if self._db:
+                self._db.close()
+                self._db = None
+
+    def _lookup(self, ident, variant):
+        "Find metadata for a file identity in memory or on disk"
+        cached = self.memory.get((ident[0], variant))
+        if cached and cached[0] == ident:
+            return cached[1]
+        if self._db:
+            row = self._db.execute(
+                "SELECT data FROM metadata WHERE path=? AND variant=? AND "
+                "size=? AND mtime_ns=? AND inode=?",
+                (ident[0], variant) + ident[1:]).fetchone()
+            if row:
+                meta = self._prepare(json.loads(row[0]))
+                self.variants.add(variant)  # to be found by `invalidate`
+                self.memory.put((ident[0], variant), (ident, meta), len(row[0]))
+                return meta
+        return None
+
+    def _prepare(self, meta):
+        "Metadata as kept in memory"
+        if self.max_value_size is not None:
+            meta = blobs.wrap_values(meta, self.max_value_size)
+        return meta if self.schemas is None else self.schemas.record(meta)
+
+    def _store(self, items, variant):
+        "Save [(identity, metadata, JSON text)] in memory and on disk"
+        rows = []
+        self.variants.add(variant)
+        for ident, meta, text in items:
+            self.memory.put((ident[0], variant), (ident, meta), len(text))
+            rows.append((ident[0], variant) + ident[1:] + (text,))
+        if self._db and rows:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+
+    def get_metadata_batch(self, filenames, profile=None, fast=0):
+        """
+        Return all metadata for the given files, see
+        `ExifTool.get_metadata_batch`. Files which exiftool returned
+        nothing for are `None`
+        """
+        filenames, variant = list(filenames), variant_key(profile, fast)
+        idents = [file_identity(i) for i in filenames]
+        result, missing = [None] * len(filenames), []
+        with self._lock:
+            for i, ident in enumerate(idents):
+                meta = self._lookup(ident, variant) if ident else None
+                if meta is None:
+                    missing.append(i)
+                else:
+                    result[i] = meta
+            self.hits += len(filenames) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return result
+        # Not locked, so lookups of other threads don't wait for exiftool
+        fetched = self.exiftool.get_metadata_batch(
+            [filenames[i] for i in missing], profile=profile, fast=fast)
+        if len(fetched) != len(missing):  # exiftool skipped some files
+            by_source = metadiff.by_source_file(fetched)
+            fetched = [by_source.get(metadiff.normpath(filenames[i]))
+                       for i in missing]
+        texts = [None if meta is None else json.dumps(meta)
+                 for meta in fetched]
+        with self._lock:
+            stored = []
+            for i, meta, text in zip(missing, fetched, texts):
+                if meta is None:
+                    continue
+                result[i] = meta = self._prepare(meta)
+                if idents[i]:
+                    stored.append((idents[i], meta, text))
+            self._store(stored, variant)
+        return result
+
+    def get_metadata(self, filename, profile=None, fast=0):
+        "Return metadata for a single file, see `ExifTool.get_metadata`"
+        return self.get_metadata_batch([filename], profile, fast)[0]
+
+    def invalidate(self, filenames):
+        "Forget cached metadata of the given files"
+        with self._lock:
+            paths = [os.path.abspath(os.fsdecode(i)) for i in filenames]
+            for path in paths:
+                for variant in self.variants:
+                    self.memory.pop((path, variant))
+            if self._db:
+                with self._db:
+                    self._db.executemany("DELETE FROM metadata WHERE path=?",
+                                         [(i,) for i in paths])
+
+    def stats(self):
+        "Counters snapshot"
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self.memory),
+                    "bytes": self.memory.nbytes}
+
+
+class BlobCache():
+    """
+    Values of `blobs.BlobHandle` fetched with `ExifTool.get_tag_bytes`,
+    recently used ones are kept within `max_bytes`. Like metadata they
+    are keyed on file identity, so values of rewritten files are fetched
+    again
+    """
+    def __init__(self, exiftool_, max_bytes=32 << 20):
+        self.exiftool = exiftool_
+        self.memory = LRU(max_bytes)  # (identity, tag) -> bytes
+        self._lock = threading.Lock()
+
+    def fetch(self, handle):
+        "Raw bytes of the value of `handle` in the file as it is now"
+        ident = file_identity(handle.path)
+        key = ident, handle.tag
+        with self._lock:
+            data = self.memory.get(key) if ident else None
+            if data is None:
+                data = self.exiftool.get_tag_bytes(handle.tag, handle.path)
+                if ident:
+                    self.memory.put(key, data, len(data))
+            return data
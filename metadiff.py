@@ -0,0 +1,116 @@
+"""
+Comparison of metadata of two files
+
+The tag keys of both files are merged into one sorted union in a single
+pass, and every row of the union knows its value on each side and its
+diff status, so both sides can be displayed aligned row for row.
+"""
+
+import os
+
+SAME, CHANGED, LEFT_ONLY, RIGHT_ONLY = range(4)  # row status
+STATUS_NAMES = "same", "changed", "left_only", "right_only"
+
+
+def normpath(path):
+    "Normalized path for matching exiftool's `SourceFile` to input paths"
+    return os.path.normcase(os.path.normpath(os.fsdecode(path)))
+
+
+def by_source_file(metas):
+    """
+    Index metadata by normalized `SourceFile`, exiftool omits
+    files it could not read so results may not match input by position
+    """
+    return {normpath(d.get("SourceFile", "")): d for d in metas if d}
+
+
+def merge_keys(left, right):
+    """
+    Merge-join sorted key lists. Returns list of (key, in_left, in_right)
+    """
+    rows, i, j = [], 0, 0
+    n_left, n_right = len(left), len(right)
+    while i < n_left and j < n_right:
+        a, b = left[i], right[j]
+        if a == b:
+            rows.append((a, True, True))
+            i += 1
+            j += 1
+        elif a < b:
+            rows.append((a, True, False))
+            i += 1
+        else:
+            rows.append((b, False, True))
+            j += 1
+    rows.extend((k, True, False) for k in left[i:])
+    rows.extend((k, False, True) for k in right[j:])
+    return rows
+
+
+def row_status(v_left, v_right):
+    "Status of a row with values `v_left`, `v_right` (`None` if absent)"
+    if v_left is None:
+        return RIGHT_ONLY
+    if v_right is None:
+        return LEFT_ONLY
+    return SAME if v_left == v_right else CHANGED
+
+
+def diff(left, right, ignore=()):
+    """
+    Tags which differ between metadata mappings `left` and `right`:
+    [(key, left value, right value, status)], sorted by key.
+    Values are `None` where absent. Keys in `ignore` are skipped
+    """
+    left, right = left or {}, right or {}
+    result = []
+    for k, in_left, in_right in merge_keys(sorted(left), sorted(right)):
+        if k in ignore:
+            continue
+        v_left = left[k] if in_left else None
+        v_right = right[k] if in_right else None
+        status = row_status(v_left, v_right)
+        if status != SAME:
+            result.append((k, v_left, v_right, status))
+    return result
+
+
+class Comparison():
+    """
+    Aligned union of the tags of two metadata mappings (sides 0 and 1).
+    `keys`, `values[side]` and `status` are parallel lists, `values` are
+    `None` where a side doesn't have the tag.
+    """
+    def __init__(self):
+        self.metas = [{}, {}]
+        self.sorted_keys = [[], []]
+        self.keys, self.values, self.status = [], ([], []), []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set_side(self, side, meta):
+        """
+        Replace metadata of `side`. Only that side is re-sorted, then rows
+        are rebuilt with one merge pass. Returns `True` if the list of keys
+        has changed, otherwise rows keep their positions.
+        """
+        meta = {} if meta is None else meta
+        self.metas[side] = meta
+        self.sorted_keys[side] = sorted(meta)
+        rows = merge_keys(*self.sorted_keys)
+        keys = [k for k, _, _ in rows]
+        left, right = self.metas
+        values = ([left[k] if l else None for k, l, _ in rows],
+                  [right[k] if r else None for k, _, r in rows])
+        reset = keys != self.keys
+        self.keys, self.values = keys, values
+        self.status = list(map(row_status, *values))
+        return reset
+
+    def differences(self):
+        "Rows which are not the same on both sides: [(key, left, right)]"
+        left, right = self.values
+        return [(k, left[i], right[i]) for i, k in enumerate(self.keys)
+                if self.status[i] != SAME]
@@ -0,0 +1,141 @@
+"""
+Background metadata loading for the file panels
+"""
+
+import threading
+from collections import OrderedDict
+from qtapp import QtCore
+import metadiff
+
+
+class MetadataLoader(QtCore.QObject):
+    """
+    Load metadata on a worker thread. Requests are made per key (a panel),
+    a new request replaces the pending one of the same key, and results
+    of requests which became obsolete while loading are dropped.
+    Pending requests of several keys with the same profile are loaded
+    in one batch. Prefetch requests are served only when no regular
+    request is pending;
+    their results are not delivered, they only warm up `source` (which
+    should be a bounded cache, e.g. MetadataCache).
+    """
+    loaded = QtCore.Signal(object, str, object)  # key, path, metadata
+    failed = QtCore.Signal(object, str, str)  # key, path, error message
+
+    def __init__(self, source):
+        "`source` provides `get_metadata`, e.g. ExifTool or MetadataCache"
+        super().__init__()
+        self.source = source
+        self._pending = OrderedDict()  # key -> (path, profile, generation)
+        self._generation = {}  # key -> number of the latest request
+        self._prefetch = OrderedDict()  # key -> ([path, ...], profile)
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="MetadataLoader")
+        self._thread.start()
+
+    def request(self, key, path, profile=None):
+        """
+        Load metadata of `path` for `key`, forget previous request of `key`.
+        `profile` is a tag profile, see `exiftool.profiles`
+        """
+        self.request_batch([(key, path, profile)])
+
+    def request_batch(self, requests):
+        """
+        Make several requests [(key, path, profile), ...] at once, those
+        with the same profile are loaded in one batch
+        """
+        with self._cond:
+            for key, path, profile in requests:
+                generation = self._generation.get(key, 0) + 1
+                self._generation[key] = generation
+                self._pending.pop(key, None)
+                self._pending[key] = path, profile, generation
+            self._cond.notify()
+
+    def prefetch(self, key, paths, profile=None):
+        "Load `paths` in background for `key`, replaces previous prefetch"
+        with self._cond:
+            self._prefetch.pop(key, None)
+            if paths:
+                self._prefetch[key] = list(paths), profile
+                self._cond.notify()
+
+    def cancel_prefetch(self, key):
+        "Forget pending prefetch of `key`"
+        with self._cond:
+            self._prefetch.pop(key, None)
+
+    def is_current(self, key, generation):
+        "Request `generation` of `key` was not superseded"
+        with self._cond:
+            return self._generation.get(key) == generation
+
+    def stop(self):
+        "Stop the worker thread after the current request"
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._prefetch.clear()
+            self._cond.notify()
+        self._thread.join()
+
+    def _next(self):
+        """
+        Wait for the next request, `None` when stopped.
+        Returns (profile, [(key, path, generation), ...], None) for pending
+        requests of one profile or (profile, None, [path, ...]) for prefetch
+        """
+        with self._cond:
+            while not (self._pending or self._prefetch or self._stopped):
+                self._cond.wait()
+            if self._stopped:
+                return None
+            if self._pending:
+                key, (path, profile, generation) = \
+                    self._pending.popitem(last=False)
+                requests = [(key, path, generation)]
+                for key, (path, profile_, generation) in list(
+                        self._pending.items()):
+                    if profile_ == profile:
+                        del self._pending[key]
+                        requests.append((key, path, generation))
+                return profile, requests, None
+            _, (paths, profile) = self._prefetch.popitem(last=False)
+            return profile, None, paths
+
+    def _load(self, paths, profile):
+        "Metadata of `paths` in the same order, `None` for missing files"
+        metas = self.source.get_metadata_batch(paths, profile)
+        if len(metas) != len(paths):  # exiftool skipped some files
+            by_source = metadiff.by_source_file(metas)
+            metas = [by_source.get(metadiff.normpath(i)) for i in paths]
+        return metas
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            profile, requests, paths = item
+            if requests is None:
+                try:
+                    self.source.get_metadata_batch(paths, profile)
+                except Exception:  # pylint: disable=broad-except
+                    pass  # will be reported if the file is requested
+                continue
+            try:
+                metas = self._load([path for _, path, _ in requests], profile)
+            except Exception as e:  # pylint: disable=broad-except
+                metas = [e] * len(requests)
+            for (key, path, generation), meta in zip(requests, metas):
+                if not self.is_current(key, generation):
+                    continue
+                if isinstance(meta, Exception):
+                    self.failed.emit(key, path, str(meta))
+                elif meta is None:
+                    self.failed.emit(key, path, "no metadata")
+                else:
+                    self.loaded.emit(key, path, meta)
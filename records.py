@@ -0,0 +1,80 @@
+"""
+Compact read-only metadata records
+
+Metadata of files of one folder mostly share the same tags, so instead
+of a dict per file a record keeps a tuple of values and a reference to
+a shared schema: the interned key tuple and the key -> position index.
+Records are read-only mappings and can be used in place of the dicts
+returned by `ExifTool.execute_json`.
+"""
+
+import sys
+from collections.abc import Mapping
+
+# String values up to this length are interned, long values are unique
+# too often to be worth it
+INTERN_MAX_LENGTH = 64
+
+
+class Schema():
+    "Ordered set of keys shared by records"
+    __slots__ = ("keys", "index")
+
+    def __init__(self, keys):
+        self.keys = tuple(sys.intern(k) for k in keys)
+        self.index = {k: i for i, k in enumerate(self.keys)}
+
+
+class Record(Mapping):
+    "Read-only mapping of schema keys to values"
+    __slots__ = ("schema", "_values")
+
+    def __init__(self, schema, values):
+        self.schema = schema
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self.schema.index[key]]
+
+    def __iter__(self):
+        return iter(self.schema.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self.schema.index
+
+    def get(self, key, default=None):
+        i = self.schema.index.get(key)
+        return default if i is None else self._values[i]
+
+    def __repr__(self):
+        return "Record(%r)" % dict(self.items())
+
+
+class SchemaTable():
+    "Makes records sharing one schema per distinct key set"
+    def __init__(self):
+        self._schemas = {}  # key tuple -> Schema
+
+    def __len__(self):
+        return len(self._schemas)
+
+    def record(self, d):
+        "Compact record with the items of mapping `d`"
+        if isinstance(d, Record):
+            return d
+        keys = tuple(d)
+        schema = self._schemas.get(keys)
+        if schema is None:
+            schema = self._schemas[keys] = Schema(keys)
+        return Record(schema, tuple(
+            sys.intern(v) if isinstance(v, str) and
+            len(v) <= INTERN_MAX_LENGTH else v for v in d.values()))
+
+
+def compact(dicts, table=None):
+    "List of records for `dicts`, sharing schemas of `table` if given"
+    table = SchemaTable() if table is None else table
+    return [None if d is None else table.record(d) for d in dicts]
@@ -0,0 +1,77 @@
+"""
+Copy tags from one file to other files with ``exiftool -tagsFromFile``
+
+All targets get the tags in as few exiftool commands as possible:
+the source file, the tag list and up to `MAX_TARGETS` target files are
+passed to a single command.
+"""
+
+import re
+
+import metadiff
+from exiftool import fsencode
+
+MAX_TARGETS = 1000  # target files per exiftool command
+# Groups with no writable tags, or tags computed from other tags
+READ_ONLY_GROUPS = {"File", "System", "ExifTool", "Composite"}
+RESULT_RE = re.compile(
+    r"(\d+) (?:image )?files? (updated|unchanged|weren't updated)")
+
+
+def writable_tags(tags):
+    "Tags of `tags` (in the format <group>:<tag>) which can be copied"
+    return [t for t in tags if t != "SourceFile" and
+            t.partition(":")[0] not in READ_ONLY_GROUPS]
+
+
+def plan(source_meta, target_metas, tags):
+    """
+    What copying `tags` would change: [(target index, [(tag, old, new)])],
+    targets without changes are omitted. Values are `None` where absent
+    """
+    result = []
+    for i, meta in enumerate(target_metas):
+        meta = meta or {}
+        changes = [(t, meta.get(t), source_meta.get(t)) for t in tags
+                   if meta.get(t) != source_meta.get(t)]
+        if changes:
+            result.append((i, changes))
+    return result
+
+
+def copy_tags(exiftool_, source, targets, tags, dry_run=False, cache=None,
+              profile=None, overwrite_original=False):
+    """
+    Copy `tags` from file `source` to files `targets`.
+
+    With `dry_run` nothing is written and the changes are returned, see
+    `plan`. Otherwise returns counts of files reported by exiftool:
+    {"updated": n, "unchanged": n, "weren't updated": n}.
+    exiftool keeps each original file as "<name>_original", unless
+    `overwrite_original` is set.
+    `cache` (a `metacache.MetadataCache`) of written targets is
+    invalidated and refreshed with one batch of tag `profile`
+    """
+    tags, targets = writable_tags(tags), list(targets)
+    if not tags or not targets:
+        return [] if dry_run else {}
+    if dry_run:
+        metas = metadiff.by_source_file(
+            exiftool_.get_tags_batch(tags, [source] + targets))
+        return plan(metas.get(metadiff.normpath(source), {}),
+                    [metas.get(metadiff.normpath(i)) for i in targets], tags)
+    # Redirect each tag to the same group, not to the preferred one
+    params = [b"-overwrite_original"] if overwrite_original else []
+    params += [b"-tagsFromFile", fsencode(source)]
+    params.extend(fsencode("-%s>%s" % (t, t)) for t in tags)
+    counts = {}
+    for i in range(0, len(targets), MAX_TARGETS):
+        output = exiftool_.execute(*params + [
+            fsencode(t) for t in targets[i:i+MAX_TARGETS]])
+        for count, what in RESULT_RE.findall(output.decode("utf-8",
+                                                           "replace")):
+            counts[what] = counts.get(what, 0) + int(count)
+    if cache is not None:
+        cache.invalidate(targets)
+        cache.get_metadata_batch(targets, profile)
+    return counts
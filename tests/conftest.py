@@ -0,0 +1,9 @@
+"""
+The modules under test are in the parent folder, they are not installed
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
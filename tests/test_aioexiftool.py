@@ -0,0 +1,37 @@
+"""
+asyncio client against the fake exiftool of the benchmarks
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from aioexiftool import AsyncExifTool
+
+FAKE_EXIFTOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "benchmarks", "fake_exiftool.py")
+FILES = ["folder/IMG_%04d.JPG" % i for i in range(2000)]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="runs a script as executable")
+def test_call_after_cancelled_batch(monkeypatch):
+    monkeypatch.setenv("FAKE_EXIFTOOL_TAGS", "20")
+    monkeypatch.setenv("FAKE_EXIFTOOL_LATENCY", "0.2")
+
+    async def run():
+        async with AsyncExifTool(FAKE_EXIFTOOL) as et:
+            with pytest.raises(asyncio.TimeoutError):
+                await et.get_metadata_batch(FILES, timeout=.05)
+            task = asyncio.ensure_future(et.get_metadata_batch(FILES))
+            await asyncio.sleep(.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # output of both batches is skipped, not taken for this one
+            meta = await et.get_metadata("next.jpg", timeout=5)
+            assert meta["SourceFile"] == "next.jpg"
+            metas = await et.get_metadata_batch(FILES[:3])
+            assert [d["SourceFile"] for d in metas] == FILES[:3]
+
+    asyncio.run(run())
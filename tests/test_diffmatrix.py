@@ -0,0 +1,77 @@
+"""
+Tag x file matrix of the metadata of a folder
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+import diffmatrix  # pylint: disable=wrong-import-position
+
+FILES = ["a.jpg", "b.jpg", "c.jpg"]
+METAS = [{"SourceFile": "a.jpg", "X": 1, "Y": "p", "L": [1, 2]},
+         {"SourceFile": "b.jpg", "X": 1, "Y": "q", "L": [1, 2]},
+         {"SourceFile": "c.jpg", "X": 1, "L": [1, 2], "Z": 5}]
+
+
+class Source():
+    "Metadata of `METAS` by file name, records the batches"
+    def __init__(self):
+        self.batches = []
+
+    def get_metadata_batch(self, filenames):
+        self.batches.append(list(filenames))
+        return [METAS[FILES.index(i)] for i in filenames]
+
+
+def test_codes():
+    matrix = diffmatrix.DiffMatrix(FILES, METAS)
+    assert matrix.tags == ["X", "Y", "L", "Z"]  # SourceFile is ignored
+    assert matrix.shape == (4, 3)
+    assert matrix.codes.tolist() == [[0, 0, 0], [0, 1, -1], [0, 0, 0],
+                                     [-1, -1, 0]]
+    assert matrix.value(2, 1) == [1, 2]
+    assert matrix.value(1, 2) is None
+
+
+def test_varying_and_deviations():
+    matrix = diffmatrix.DiffMatrix(FILES, METAS)
+    assert matrix.varying().tolist() == [False, True, False, True]
+    assert matrix.varying_tags() == ["Y", "Z"]
+    mask, counts = matrix.deviations(0)
+    assert mask[1].tolist() == [False, True, True]
+    assert counts.tolist() == [0, 1, 2]
+    assert matrix.deviations(2)[1].tolist() == [2, 2, 0]
+
+
+def test_groups():
+    matrix = diffmatrix.DiffMatrix(FILES, METAS)
+    groups, count = matrix.groups(["X"])
+    assert groups.tolist() == [0, 0, 0] and count == 1
+    groups, count = matrix.groups(["Y"])
+    assert count == 3 and len(set(groups.tolist())) == 3
+    groups, count = matrix.groups(["Z"])
+    assert count == 2 and groups[0] == groups[1] != groups[2]
+    groups, count = matrix.groups([])  # nothing selected: one group
+    assert groups.tolist() == [0, 0, 0] and count == 1
+    assert matrix.groups()[1] == 3
+
+
+def test_no_files_and_unloaded_files():
+    matrix = diffmatrix.DiffMatrix([], [])
+    assert matrix.shape == (0, 0) and matrix.varying().tolist() == []
+    groups, count = matrix.groups()
+    assert groups.tolist() == [] and count == 0
+    matrix = diffmatrix.DiffMatrix(["a.jpg", "x.jpg"], [METAS[0], None])
+    assert matrix.codes[:, 1].tolist() == [diffmatrix.MISSING] * 3
+    assert matrix.varying().all()
+
+
+def test_load_in_chunks(monkeypatch):
+    monkeypatch.setattr(diffmatrix, "CHUNK_SIZE", 2)
+    source, progress = Source(), []
+    matrix = diffmatrix.DiffMatrix.load(
+        source, FILES, lambda done, total: progress.append((done, total)))
+    assert source.batches == [FILES[:2], FILES[2:]]
+    assert progress == [(2, 3), (3, 3)]
+    assert matrix.codes.tolist() == diffmatrix.DiffMatrix(
+        FILES, METAS).codes.tolist()
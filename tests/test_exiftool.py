@@ -0,0 +1,247 @@
+"""
+Lazy decoding of ``exiftool -j`` output, and the bridge against the
+stand-in exiftool of the benchmarks
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+
+import exiftool
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.pardir, "benchmarks")
+FAKE_EXIFTOOL = os.path.join(BENCHMARKS, "fake_exiftool.py")
+# The stand-ins are scripts run as executables
+posix_only = pytest.mark.skipif(os.name == "nt", reason="runs scripts")
+FILES = ["folder/IMG_%04d.JPG" % i for i in range(300)]
+
+# Stand-in whose first command hangs, later ones are answered
+WEDGE_ONCE = """#!%s
+import os, sys, time
+sys.path.insert(0, %r)
+import fake_exiftool
+run = fake_exiftool.run
+
+def wedge_once(args):
+    try:
+        os.close(os.open(%r, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return run(args)
+    time.sleep(60)
+
+fake_exiftool.run = wedge_once
+fake_exiftool.main()
+"""
+
+# Layout of exiftool -j -struct: nested objects and lists are indented
+STRUCT_OUTPUT = b"""[{
+  "SourceFile": "a.jpg",
+  "XMP:RegionInfo": {
+    "AppliedToDimensions": {
+      "H": 100,
+      "W": 200
+    },
+    "RegionList": [{
+      "Name": "x\\n},\\n{"
+    },
+    {
+      "Name": "y"
+    }]
+  },
+  "EXIF:ISO": 100
+},
+{
+  "SourceFile": "b.jpg",
+  "XMP:Subject": ["a","b"]
+},
+{
+  "SourceFile": "c.jpg"
+}]
+"""
+
+
+def exiftool_json(metas):
+    "JSON text in the layout of exiftool -j"
+    return ("[" + ",\n".join(json.dumps(d, indent=2) for d in metas) +
+            "]\n").encode("utf-8")
+
+
+@pytest.mark.parametrize("output", [
+    STRUCT_OUTPUT,
+    STRUCT_OUTPUT.replace(b"\n", b"\r\n"),
+    exiftool_json([{"SourceFile": "%d.jpg" % i, "EXIF:ISO": i,
+                    "XMP:Struct": {"List": [{"A": i}, {"B": [i]}]}}
+                   for i in range(5)]),
+    exiftool_json([{"SourceFile": "a.jpg"}]),
+    b'[{"SourceFile":"a.jpg"},{"SourceFile":"b.jpg"}]',
+    b"",
+])
+def test_lazy_matches_eager(output):
+    lazy = exiftool.LazyRecords.from_output(output)
+    eager = json.loads(output) if output else []
+    assert len(lazy) == len(eager)
+    assert lazy[-1:] == eager[-1:]
+    assert list(lazy) == eager
+    assert [json.loads(lazy.raw(i)) for i in range(len(lazy))] == eager
+
+
+def test_lazy_decodes_on_access():
+    lazy = exiftool.LazyRecords.from_output(STRUCT_OUTPUT)
+    assert lazy.decoded() == 0
+    assert lazy[1]["XMP:Subject"] == ["a", "b"]
+    assert lazy[1] is lazy[1] and lazy.decoded() == 1
+    joined = exiftool.LazyRecords.join([lazy, lazy])
+    assert len(joined) == 6 and joined.decoded() == 2
+    assert joined[3] == lazy[0]
+
+
+@pytest.fixture
+def fake_env(monkeypatch):
+    "Small output of the fake exiftool"
+    monkeypatch.setenv("FAKE_EXIFTOOL_TAGS", "20")
+    monkeypatch.setenv("FAKE_EXIFTOOL_VALUE_SIZE", "16")
+
+
+def wedge_once(tmp_path):
+    "Path of a stand-in exiftool hanging on the first command of a test"
+    path = tmp_path / "wedge_once.py"
+    path.write_text(WEDGE_ONCE % (sys.executable, BENCHMARKS,
+                                  str(tmp_path / "wedged")))
+    path.chmod(0o755)
+    return str(path)
+
+
+@posix_only
+def test_batch_with_fake_exiftool(fake_env):
+    with exiftool.ExifTool(FAKE_EXIFTOOL) as et:
+        eager = et.get_metadata_batch(FILES)
+        assert [d["SourceFile"] for d in eager] == FILES
+        assert list(et.get_metadata_batch(FILES, lazy=True)) == eager
+        assert list(et.get_metadata_batch(iter(FILES), lazy=True)) == eager
+        assert et.get_metadata(FILES[0]) == eager[0]
+
+
+def test_only_large_batches_are_streamed():
+    small = exiftool.ExifTool._batch_params(["-fast"], ["a.jpg", "b.jpg"])
+    assert small == ("-fast", "a.jpg", "b.jpg")
+    large = exiftool.ExifTool._batch_params(
+        [], ["a.jpg"] * exiftool.stream_params)
+    assert not isinstance(large, tuple)
+    assert list(large) == ["a.jpg"] * exiftool.stream_params
+    unsized = exiftool.ExifTool._batch_params([], iter(["a.jpg"]))
+    assert not isinstance(unsized, tuple) and list(unsized) == ["a.jpg"]
+
+
+@posix_only
+def test_failing_instrumentation_only_warns(fake_env):
+    def hook(sample):
+        raise ZeroDivisionError
+    stats = exiftool.Instrumentation(
+        export_path=os.path.join(os.devnull, "metrics.prom"))
+    stats.add_hook(hook)
+    with exiftool.ExifTool(FAKE_EXIFTOOL, stats=stats) as et:
+        with pytest.warns(UserWarning) as warned:
+            assert et.get_metadata("a.jpg")["SourceFile"] == "a.jpg"
+    messages = [str(i.message) for i in warned]
+    assert any("hook" in i for i in messages)
+    assert any("export" in i for i in messages)
+    assert stats.snapshot()["commands"] >= 1
+
+
+@posix_only
+def test_pool_batches(fake_env):
+    with exiftool.ExifToolPool(3, FAKE_EXIFTOOL) as pool:
+        metas = pool.get_metadata_batch(FILES)
+        assert [d["SourceFile"] for d in metas] == FILES
+        lazy = pool.get_metadata_batch(FILES, lazy=True)
+        assert isinstance(lazy, exiftool.LazyRecords)
+        assert lazy.decoded() == 0 and list(lazy) == metas
+        assert pool.get_tag_batch("EXIF:Tag0", FILES) == \
+            ["value 0".ljust(16, "x")] * len(FILES)
+        assert pool.get_metadata_batch([]) == []
+        assert len(pool.get_metadata_batch([], lazy=True)) == 0
+        assert pool.stats.snapshot()["commands"] > 3  # several chunks
+
+
+@posix_only
+def test_pool_hedges_wedged_worker(fake_env, tmp_path):
+    pool = exiftool.ExifToolPool(1, wedge_once(tmp_path), hedge_after=.2)
+    with pool:
+        started = time.perf_counter()
+        metas = pool.get_metadata_batch(FILES[:8])
+        assert [d["SourceFile"] for d in metas] == FILES[:8]
+        assert time.perf_counter() - started < 10
+        counts = pool.stats.snapshot()
+        assert counts["hedges"] == 1 and counts["restarts"] == 1
+        # the wedged worker was restarted and is used again
+        assert pool.get_metadata_batch(FILES[:8]) == metas
+        assert pool.stats.snapshot()["hedges"] == 1
+
+
+@posix_only
+def test_pipelined_concurrent_callers(fake_env):
+    with exiftool.PipelinedExifTool(FAKE_EXIFTOOL) as et:
+        def load(i):
+            files = FILES[i::8]
+            return files, et.get_metadata_batch(files)
+        with ThreadPoolExecutor(8) as executor:
+            for files, metas in executor.map(load, range(8)):
+                assert [d["SourceFile"] for d in metas] == files
+
+
+@posix_only
+def test_pipelined_submit(fake_env):
+    with exiftool.PipelinedExifTool(FAKE_EXIFTOOL) as et:
+        futures = [et.submit(b"-j", name.encode()) for name in FILES[:20]]
+        binary = b"\x00\xffBINARY" * 16
+        raw = [et.submit(b"-b", b"-EXIF:Tag0", b"a.jpg", raw=True),
+               et.submit(b"-ver"),
+               et.submit(b"-b", b"-EXIF:Tag0", b"a.jpg", raw=True)]
+        for name, future in zip(FILES, futures):
+            assert json.loads(future.result(5))[0]["SourceFile"] == name
+        assert [i.result(5) for i in raw] == [binary, b"12.00", binary]
+    # Commands are accounted by the reader thread, which has finished
+    assert et.stats.snapshot()["commands"] >= 23
+
+
+@posix_only
+def test_pipelined_kill_fails_commands_in_flight(fake_env, monkeypatch):
+    monkeypatch.setenv("FAKE_EXIFTOOL_LATENCY", "0.2")
+    with exiftool.PipelinedExifTool(FAKE_EXIFTOOL) as et:
+        futures = [et.submit(b"-ver") for _ in range(3)]
+        et._process.kill()
+        for future in futures:
+            with pytest.raises(IOError):
+                future.result(5)
+        # the next command restarts the process
+        assert et.execute(b"-ver") == b"12.00"
+        assert et.stats.snapshot()["restarts"] == 1
+
+
+@posix_only
+def test_pipelined_timeout_during_large_write(fake_env, monkeypatch):
+    # The first command wedges the stand-in, so a large command written
+    # after it blocks on the full pipe while holding the write lock
+    monkeypatch.setenv("FAKE_EXIFTOOL_LATENCY", "1000")
+    names = ["folder/IMG_%05d.JPG" % i for i in range(20000)]
+    et = exiftool.PipelinedExifTool(FAKE_EXIFTOOL, timeout=1)
+    et.start()
+    executor = ThreadPoolExecutor(2)
+    try:
+        timed_out = executor.submit(et.get_metadata, "a.jpg")
+        time.sleep(0.1)
+        large = executor.submit(et.get_metadata_batch, names)
+        _, pending = wait([timed_out, large], 10)
+        assert not pending
+        assert isinstance(timed_out.exception(), TimeoutError)
+        assert isinstance(large.exception(), OSError)
+    finally:
+        if not (timed_out.done() and large.done()):
+            et._process.kill()  # do not hang the test run
+        executor.shutdown(wait=False)
+    et.terminate()
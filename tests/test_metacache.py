@@ -0,0 +1,60 @@
+"""
+Metadata cache against a stand-in for ExifTool
+"""
+
+import metacache
+
+
+class Source():
+    "Returns metadata with the file name, counts files asked for"
+    def __init__(self):
+        self.calls = 0
+
+    def get_metadata_batch(self, filenames, profile=None, fast=0):
+        self.calls += len(filenames)
+        return [{"SourceFile": str(i), "EXIF:Make": "Canon"}
+                for i in filenames]
+
+
+def test_invalidate_entry_loaded_from_store(tmp_path):
+    image, db_path = tmp_path / "a.jpg", str(tmp_path / "cache.sqlite")
+    image.write_bytes(b"x")
+    source = Source()
+    cache = metacache.MetadataCache(source, db_path=db_path)
+    cache.get_metadata(str(image), "capture")
+    cache.close()
+    cache = metacache.MetadataCache(source, db_path=db_path)
+    assert cache.get_metadata(str(image), "capture")["EXIF:Make"] == "Canon"
+    assert source.calls == 1
+    cache.invalidate([str(image)])
+    cache.get_metadata(str(image), "capture")
+    assert source.calls == 2
+    cache.close()
+
+
+def test_lru_evicts_least_recently_used():
+    lru = metacache.LRU(10)
+    lru.put("a", 1, 4)
+    lru.put("b", 2, 4)
+    assert lru.get("a") == 1  # "b" is now the oldest
+    lru.put("c", 3, 4)
+    assert "b" not in lru and "a" in lru and "c" in lru
+    assert lru.nbytes == 8 and len(lru) == 2
+
+
+def test_lru_sizes():
+    lru = metacache.LRU(10)
+    lru.put("a", 1, 4)
+    lru.put("a", 2, 6)
+    assert lru.get("a") == 2 and lru.nbytes == 6
+    lru.put("big", 3, 11)  # larger than the budget, not kept
+    assert "big" not in lru and lru.nbytes == 6
+    assert lru.pop("a") == 2 and lru.pop("a", "gone") == "gone"
+    assert lru.nbytes == 0 and lru.get("a") is None
+
+
+def test_variant_key():
+    assert metacache.variant_key() == "all"
+    assert metacache.variant_key("capture", 2) == "capture/fast2"
+    assert metacache.variant_key(["b", "a"]) == metacache.variant_key(
+        ["a", "b"])
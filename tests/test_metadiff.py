@@ -0,0 +1,46 @@
+"""
+Comparison of the metadata of two files
+"""
+
+import metadiff
+from metadiff import SAME, CHANGED, LEFT_ONLY, RIGHT_ONLY
+
+
+def test_merge_keys():
+    assert metadiff.merge_keys(["a", "c", "d"], ["b", "c"]) == [
+        ("a", True, False), ("b", False, True), ("c", True, True),
+        ("d", True, False)]
+    assert metadiff.merge_keys([], ["a"]) == [("a", False, True)]
+
+
+def test_comparison_rows_aligned():
+    comparison = metadiff.Comparison()
+    assert comparison.set_side(0, {"a": 1, "b": 2})
+    assert comparison.set_side(1, {"b": 3, "c": 4})
+    assert comparison.keys == ["a", "b", "c"]
+    assert comparison.values == ([1, 2, None], [None, 3, 4])
+    assert comparison.status == [LEFT_ONLY, CHANGED, RIGHT_ONLY]
+    assert comparison.differences() == [("a", 1, None), ("b", 2, 3),
+                                        ("c", None, 4)]
+    # same keys: rows keep their positions
+    assert not comparison.set_side(1, {"a": 1, "b": 2, "c": 4})
+    assert comparison.status == [SAME, SAME, RIGHT_ONLY]
+
+
+def test_diff():
+    left = {"SourceFile": "a.jpg", "EXIF:ISO": 100, "EXIF:Make": "Canon"}
+    right = {"SourceFile": "b.jpg", "EXIF:ISO": 200, "EXIF:Model": "R5",
+             "EXIF:Make": "Canon"}
+    assert metadiff.diff(left, right, ignore={"SourceFile"}) == [
+        ("EXIF:ISO", 100, 200, CHANGED),
+        ("EXIF:Model", None, "R5", RIGHT_ONLY)]
+    assert metadiff.diff(left, None) == [
+        (k, left[k], None, LEFT_ONLY) for k in sorted(left)]
+
+
+def test_by_source_file():
+    metas = [{"SourceFile": "dir/a.jpg", "EXIF:ISO": 1}, None,
+             {"SourceFile": "dir/./b.jpg"}]
+    found = metadiff.by_source_file(metas)
+    assert found[metadiff.normpath("dir/a.jpg")]["EXIF:ISO"] == 1
+    assert metadiff.normpath("dir/b.jpg") in found and len(found) == 2
@@ -0,0 +1,32 @@
+"""
+Records behave like the dicts they replace
+"""
+
+import records
+
+META = {"SourceFile": "a.jpg", "EXIF:Make": "Canon", "EXIF:ISO": 100,
+        "XMP:Subject": ["a", "b"]}
+
+
+def test_record_as_dict():
+    record = records.SchemaTable().record(META)
+    assert list(record.keys()) == list(META.keys())
+    assert list(record.values()) == list(META.values())
+    assert list(record.items()) == list(META.items())
+    assert record == META and META == record
+    assert dict(record) == META
+    assert len(record) == len(META)
+    assert record["EXIF:ISO"] == 100
+    assert record.get("EXIF:ISO") == 100
+    assert record.get("EXIF:Model") is None
+    assert record.get("EXIF:Model", "") == ""
+    assert "EXIF:Make" in record and "EXIF:Model" not in record
+
+
+def test_records_share_schema():
+    table = records.SchemaTable()
+    first, second = records.compact([META, dict(META, **{"EXIF:ISO": 200}),
+                                      None], table)[:2]
+    assert first.schema is second.schema and len(table) == 1
+    assert first != second
+    assert table.record(first) is first
@@ -0,0 +1,76 @@
+"""
+Choosing, planning and copying tags with the stand-in exiftool
+"""
+
+import os
+
+import pytest
+
+import exiftool
+import tagcopy
+
+FAKE_EXIFTOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "benchmarks", "fake_exiftool.py")
+posix_only = pytest.mark.skipif(os.name == "nt", reason="runs scripts")
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    "Running stand-in exiftool with small output"
+    monkeypatch.setenv("FAKE_EXIFTOOL_TAGS", "20")
+    monkeypatch.setenv("FAKE_EXIFTOOL_VALUE_SIZE", "16")
+    et = exiftool.ExifTool(FAKE_EXIFTOOL)
+    et.start()
+    yield et
+    et.terminate()
+
+
+def test_writable_tags():
+    tags = ["SourceFile", "EXIF:ISO", "File:FileSize", "System:FileName",
+            "ExifTool:Warning", "Composite:Aperture", "XMP:Subject",
+            "MakerNotes:Tag1"]
+    assert tagcopy.writable_tags(tags) == ["EXIF:ISO", "XMP:Subject",
+                                           "MakerNotes:Tag1"]
+
+
+def test_plan():
+    source = {"EXIF:ISO": 100, "XMP:Subject": "a"}
+    targets = [{"EXIF:ISO": 100, "XMP:Subject": "a"},
+               {"EXIF:ISO": 200},
+               None]
+    assert tagcopy.plan(source, targets, ["EXIF:ISO", "XMP:Subject"]) == [
+        (1, [("EXIF:ISO", 200, 100), ("XMP:Subject", None, "a")]),
+        (2, [("EXIF:ISO", None, 100), ("XMP:Subject", None, "a")])]
+
+
+def test_no_tags_or_targets():
+    assert tagcopy.copy_tags(None, "a.jpg", [], ["EXIF:ISO"]) == {}
+    assert tagcopy.copy_tags(None, "a.jpg", ["b.jpg"], ["File:FileSize"],
+                             dry_run=True) == []
+
+
+@posix_only
+def test_dry_run(fake):
+    # The stand-in reports the same values for every file
+    assert tagcopy.copy_tags(fake, "a.jpg", ["b.jpg", "c.jpg"],
+                             ["EXIF:Tag0", "XMP:Tag2", "File:Tag3"],
+                             dry_run=True) == []
+
+
+@posix_only
+def test_counts_of_all_commands(fake, monkeypatch):
+    monkeypatch.setattr(tagcopy, "MAX_TARGETS", 2)
+    commands = fake.stats.snapshot()["commands"]
+    counts = tagcopy.copy_tags(fake, "a.jpg",
+                               ["t%d.jpg" % i for i in range(5)],
+                               ["EXIF:Tag0", "XMP:Tag2"])
+    assert counts == {"updated": 5}
+    assert fake.stats.snapshot()["commands"] - commands == 3
+
+
+def test_result_re():
+    output = ("    1 image files updated\n"
+              "    2 image files unchanged\n"
+              "    1 files weren't updated due to errors\n")
+    assert tagcopy.RESULT_RE.findall(output) == [
+        ("1", "updated"), ("2", "unchanged"), ("1", "weren't updated")]
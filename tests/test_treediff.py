@@ -0,0 +1,60 @@
+"""
+Pairing and diffing files of two directory trees
+"""
+
+import os
+
+import treediff
+
+
+class Source():
+    "Metadata with the file's content as a tag, counts batches"
+    def __init__(self):
+        self.batches = 0
+
+    def get_metadata_batch(self, filenames):
+        self.batches += 1
+        result = []
+        for name in filenames:
+            with open(name) as f:
+                result.append({"SourceFile": name, "Test:Text": f.read()})
+        return result
+
+
+def make_tree(root, files):
+    for rel, text in files.items():
+        path = root.joinpath(*rel.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def trees(tmp_path):
+    left, right = tmp_path / "left", tmp_path / "right"
+    make_tree(left, {"a.jpg": "1", "sub/b.jpg": "2", "sub/c.jpg": "3"})
+    make_tree(right, {"a.jpg": "1", "sub/b.jpg": "changed", "z.jpg": "4"})
+    return str(left), str(right)
+
+
+def test_pair_trees(tmp_path):
+    left, right = trees(tmp_path)
+    pairs = [(rel, bool(l), bool(r))
+             for rel, l, r in treediff.pair_trees(left, right)]
+    assert pairs == [("a.jpg", True, True),
+                     (os.path.join("sub", "b.jpg"), True, True),
+                     (os.path.join("sub", "c.jpg"), True, False),
+                     ("z.jpg", False, True)]
+
+
+def test_diff_trees(tmp_path):
+    left, right = trees(tmp_path)
+    source = Source()
+    results = {rel: differences for rel, _, _, differences in
+               treediff.diff_trees(source, left, right,
+                                   ignore={"SourceFile"}, done={"z.jpg"},
+                                   batch_size=2)}
+    assert results == {
+        "a.jpg": [],
+        os.path.join("sub", "b.jpg"): [("Test:Text", "2", "changed",
+                                        treediff.metadiff.CHANGED)],
+        os.path.join("sub", "c.jpg"): []}
+    assert source.batches == 1  # the second batch has no pairs to load
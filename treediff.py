@@ -0,0 +1,109 @@
+"""
+Pair files of two directory trees by relative path and diff metadata
+
+Both trees are walked with `os.scandir` in the same sorted order, so
+pairs are found with a streaming merge-join and results of a batch are
+reported as soon as its metadata is loaded.  A journal of finished
+relative paths makes an interrupted run resumable.
+"""
+
+import os
+
+import metadiff
+
+BATCH_SIZE = 500  # pairs loaded per exiftool batch
+
+
+def walk(root, parts=()):
+    """
+    Yield (relative path parts, path) of files under `root`, sorted by
+    path parts. Unreadable directories are skipped, symlinks to
+    directories are not followed
+    """
+    try:
+        with os.scandir(root) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path, parts + (entry.name,))
+            elif entry.is_file():
+                yield parts + (entry.name,), entry.path
+        except OSError:
+            continue
+
+
+def pair_trees(left_root, right_root):
+    """
+    Yield (relative path, left path, right path) of files of both trees,
+    a path is `None` if the file exists on one side only
+    """
+    left, right = walk(left_root), walk(right_root)
+    a, b = next(left, None), next(right, None)
+    while a or b:
+        if b is None or a is not None and a[0] < b[0]:
+            yield os.path.join(*a[0]), a[1], None
+            a = next(left, None)
+        elif a is None or b[0] < a[0]:
+            yield os.path.join(*b[0]), None, b[1]
+            b = next(right, None)
+        else:
+            yield os.path.join(*a[0]), a[1], b[1]
+            a, b = next(left, None), next(right, None)
+
+
+def _batches(iterable, size):
+    batch = []
+    for i in iterable:
+        batch.append(i)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def diff_trees(source, left_root, right_root, ignore=(), done=(),
+               batch_size=BATCH_SIZE):
+    """
+    Yield (relative path, left path, right path, differences) for file
+    pairs of two trees, see `metadiff.diff`. Metadata of `batch_size`
+    pairs is loaded with one `source.get_metadata_batch` call. Relative
+    paths in `done` are skipped. Files existing on one side only are
+    reported with the other path `None` and no differences
+    """
+    pairs = (i for i in pair_trees(left_root, right_root) if i[0] not in done)
+    for batch in _batches(pairs, batch_size):
+        files = [p for _, left, right in batch for p in (left, right)
+                 if left and right]
+        metas = metadiff.by_source_file(
+            source.get_metadata_batch(files) if files else ())
+        for rel, left, right in batch:
+            if left and right:
+                differences = metadiff.diff(
+                    metas.get(metadiff.normpath(left)),
+                    metas.get(metadiff.normpath(right)), ignore)
+            else:
+                differences = []
+            yield rel, left, right, differences
+
+
+class Journal():
+    "Append-only list of finished relative paths"
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, rel):
+        "Mark `rel` finished"
+        self._file.write(rel + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()